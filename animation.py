@@ -0,0 +1,43 @@
+"""
+Animation clock for Boulderflash.
+Animated tiles share a few frame rates (speed classes). The clock works out
+each class's frame step once per drawn frame and tells which classes moved
+on, so a renderer only re-textures the tiles of those classes.
+"""
+from constants import PREDATOR, SLUDGE, BOMB
+
+# ms per frame: virus and sludge are faster, the USB key (bomb) sparkles,
+# the rest (keys, teleporters, exits...) run at the standard rate
+FAST, SPARKLE, STANDARD = 70, 80, 100
+SPEED_CLASSES = (FAST, SPARKLE, STANDARD)
+
+
+def frame_speed(key):
+    """Speed class of an animation key (a tile, or "exit_red"/"exit_green")."""
+    if key == PREDATOR or key == SLUDGE:
+        return FAST
+    if key == BOMB:
+        return SPARKLE
+    return STANDARD
+
+
+class AnimationClock:
+    """Frame steps (time // speed) per speed class, updated by tick()."""
+
+    def __init__(self):
+        self.steps = dict.fromkeys(SPEED_CLASSES, -1)
+
+    def tick(self, current_time):
+        """Move to current_time (ms); returns the speed classes whose frame advanced."""
+        advanced = []
+        steps = self.steps
+        for speed in SPEED_CLASSES:
+            step = current_time // speed
+            if step != steps[speed]:
+                steps[speed] = step
+                advanced.append(speed)
+        return advanced
+
+    def frame(self, key, count):
+        """Index of the frame to show, out of count, for an animation key."""
+        return self.steps[frame_speed(key)] % count
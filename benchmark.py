@@ -0,0 +1,227 @@
+"""
+Benchmark for the Boulderflash engine.
+Runs every level headless for a number of physics ticks and prints JSON:
+ticks/sec per level, p50/p99 times for each engine subsystem and the work
+counters, all measured by engine_stats.EngineStats.
+With --check it plays the same ticks but, after each one, compares what the
+engine keeps up to date incrementally (virus distance field, gravity reach,
+the grid's change journal) with a full recomputation, and exits with 1 on
+any difference.
+
+    python benchmark.py --ticks 500 --inputs random --output bench.json
+    python benchmark.py --check --ticks 1000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from engine import Engine, ACTIONS
+from engine_stats import EngineStats, TIMERS, COUNTERS
+from levels import LEVELS
+
+
+def make_inputs(mode, ticks, rng, script=None):
+    if mode == "idle":
+        return [None] * ticks
+    if mode == "script":
+        return [script[t % len(script)] if script else None for t in range(ticks)]
+    # Random player: moves most ticks, sometimes a bomb or pillar
+    return [rng.choice(ACTIONS + (None,)) if rng.random() < 0.6 else None for _ in range(ticks)]
+
+
+def bench_level(index, ticks, mode, seed, backend, script=None):
+    rng = random.Random(seed * 1000 + index)
+    inputs = make_inputs(mode, ticks, rng, script)
+    stats = EngineStats(window=ticks) # Toutes les ticks du niveau, pas une fenêtre
+    deaths = 0
+    done = 0
+    start = time.perf_counter()
+    while done < ticks:
+        # Le joueur est mort ou a gagné : on recharge le niveau et on continue
+        engine = Engine.from_level(LEVELS[index], seed=seed + deaths, backend=backend)
+        engine.stats = stats
+        while done < ticks:
+            outcome = engine.step(1, inputs[done:done + 1])
+            done += 1
+            if outcome is not None:
+                deaths += outcome == "dead"
+                break
+    elapsed = time.perf_counter() - start
+
+    summary = stats.summary()
+    result = {
+        "level": index,
+        "size": [engine.grid.width, engine.grid.height],
+        "ticks": done,
+        "deaths": deaths,
+        "ticks_per_sec": round(done / elapsed, 1) if elapsed else None,
+        "tick_ms": {key: round(value, 4) for key, value in summary["tick"].items()},
+        "subsystems": {name: {key + "_ms": round(value, 4) for key, value in summary[name].items()}
+                       for name in TIMERS if name != "tick"},
+        "work": {name: summary[name] for name in COUNTERS},
+    }
+    return result
+
+
+def full_distance(engine, x, y):
+    """The player distance field rebuilt from scratch, leaving the engine's own alone."""
+    saved = engine.player_distance, engine.player_distance_origin, engine.bfs_nodes
+    engine.build_player_distance(x, y)
+    fresh = engine.player_distance
+    engine.player_distance, engine.player_distance_origin, engine.bfs_nodes = saved
+    return fresh
+
+
+def full_gravity_reach(engine):
+    saved = engine.gravity_reach
+    engine.build_gravity_reach()
+    fresh = engine.gravity_reach
+    engine.gravity_reach = saved
+    return fresh
+
+
+def first_difference(grid, expected, got):
+    """(x, y) of the first flat offset where two per-cell buffers differ."""
+    i = next(i for i, (a, b) in enumerate(zip(expected, got)) if a != b)
+    return [i % grid.stride - 1, i // grid.stride - 1]
+
+
+def check_level(index, ticks, mode, seed, backend, script=None):
+    """Play like bench_level, checking the incremental structures after every tick."""
+    rng = random.Random(seed * 1000 + index)
+    inputs = make_inputs(mode, ticks, rng, script)
+    mismatches = {"distance": 0, "gravity": 0, "journal": 0}
+    first = None
+    deaths = 0
+    done = 0
+
+    def mismatch(kind, detail):
+        nonlocal first
+        mismatches[kind] += 1
+        if first is None:
+            first = {"tick": done, "check": kind, **detail}
+
+    while done < ticks:
+        engine = Engine.from_level(LEVELS[index], seed=seed + deaths, backend=backend)
+        grid = engine.grid
+        # Copie de la carte tenue à jour uniquement par le journal
+        cursor = grid.watch()
+        shadow = bytearray(grid.cells)
+        while done < ticks:
+            outcome = engine.step(1, inputs[done:done + 1])
+            done += 1
+
+            full, changes = cursor.drain()
+            if full:
+                shadow[:] = grid.cells
+            for x, y, old, new in changes:
+                i = grid.index(x, y)
+                if shadow[i] != old:
+                    mismatch("journal", {"cell": [x, y], "journal_old": old, "shadow": shadow[i]})
+                shadow[i] = new
+            if shadow != grid.cells:
+                mismatch("journal", {"cell": first_difference(grid, grid.cells, shadow)})
+                shadow[:] = grid.cells
+
+            if outcome is not None:
+                deaths += outcome == "dead"
+                break
+            # Mise à jour comme le ferait find_path_to_player, puis comparaison
+            engine.collect_changes()
+            player = engine.player
+            if engine.player_distance is not None:
+                engine.update_player_distance(player.x, player.y)
+                fresh = full_distance(engine, player.x, player.y)
+                if fresh != engine.player_distance:
+                    cell = first_difference(grid, fresh, engine.player_distance)
+                    i = grid.index(*cell)
+                    mismatch("distance", {"cell": cell, "expected": fresh[i], "got": engine.player_distance[i]})
+            if engine.gravity_reach is not None:
+                fresh = full_gravity_reach(engine)
+                for x, (expected, got) in enumerate(zip(fresh, engine.gravity_reach)):
+                    if expected != got:
+                        y = next(y for y, (a, b) in enumerate(zip(expected, got)) if a != b)
+                        mismatch("gravity", {"cell": [x, y], "expected": expected[y], "got": got[y]})
+                        engine.gravity_reach[x][:] = expected
+                        break
+
+    return {"level": index, "ticks": done, "deaths": deaths, "mismatches": mismatches, "first": first}
+
+
+def parse_levels(spec):
+    """'all', '5', '0-9' or '1,4,7' -> list of level indices."""
+    if spec == "all":
+        return list(range(len(LEVELS)))
+    indices = []
+    for part in spec.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            indices.extend(range(int(first), int(last) + 1))
+        else:
+            indices.append(int(part))
+    return indices
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine on every level, headless.")
+    parser.add_argument("--ticks", type=int, default=300, help="physics ticks per level")
+    parser.add_argument("--levels", default="all", help="'all', '0-9' or '1,4,7'")
+    parser.add_argument("--inputs", choices=("random", "idle", "script"), default="random")
+    parser.add_argument("--script", help="JSON list of actions replayed in a loop (--inputs script)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=("python", "numpy"), default="python")
+    parser.add_argument("--budget", type=float, default=150.0, help="tick budget in ms")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--check", action="store_true",
+                        help="compare the incremental structures with a full recomputation each tick")
+    args = parser.parse_args(argv)
+
+    script = None
+    if args.inputs == "script":
+        if not args.script:
+            parser.error("--inputs script needs --script FILE")
+        with open(args.script) as f:
+            script = json.load(f)
+
+    if args.check:
+        levels = [check_level(i, args.ticks, args.inputs, args.seed, args.backend, script)
+                  for i in parse_levels(args.levels)]
+        failed = [level for level in levels if level["first"] is not None]
+        for level in failed:
+            print(f"level {level['level'] + 1}: {level['mismatches']}, first {level['first']}", file=sys.stderr)
+        print(f"{len(levels)} levels checked over {args.ticks} ticks, {len(failed)} with mismatches",
+              file=sys.stderr)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"seed": args.seed, "backend": args.backend, "levels": levels}, f, indent=2)
+        return 1 if failed else 0
+
+    levels = [bench_level(i, args.ticks, args.inputs, args.seed, args.backend, script)
+              for i in parse_levels(args.levels)]
+    for level in levels:
+        level["over_budget"] = level["tick_ms"]["max"] > args.budget
+    total_ticks = sum(level["ticks"] for level in levels)
+    total_time = sum(level["ticks"] / level["ticks_per_sec"] for level in levels if level["ticks_per_sec"])
+    report = {
+        "ticks_per_level": args.ticks,
+        "inputs": args.inputs,
+        "seed": args.seed,
+        "backend": args.backend,
+        "budget_ms": args.budget,
+        "ticks_per_sec": round(total_ticks / total_time, 1) if total_time else None,
+        "over_budget": [level["level"] for level in levels if level["over_budget"]],
+        "levels": levels,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,7 +13,7 @@ package.domain = org.cyberhacker
 source.dir = .
 
 # (list) Source files to include (let empty to include all the files)
-source.include_exts = py,png,jpg,json,wav,mp3
+source.include_exts = py,png,jpg,json,wav,mp3,bfpack,atlas
 
 # (list) Source files to exclude
 source.exclude_exts = spec
@@ -39,3 +39,10 @@ BOMB = 10
 TELEPORTER = 11
 PILLAR = 12
 SLUDGE = 13
+
+# Level characters (levels.py); 'P' marks the player's start on an empty cell
+TILE_CHARS = {
+    '#': WALL, '*': DATA, 'F': FIREWALL, 'K': KEY, 'P': EMPTY,
+    'A': PREDATOR, 'B': BUILDER, 'G': GRAVITY_ZONE, 'X': EXIT,
+    'T': TELEPORTER, 'S': SLUDGE, '.': EMPTY
+}
@@ -2,41 +2,551 @@
 Engine module for Boulderflash.
 Handles physics, AI, liquids, and game rules.
 """
-import pygame
+import heapq
+import math
 import random
+import struct
+from array import array
+from collections import deque
 from constants import (
     EMPTY, DATA, WALL, FIREWALL, KEY, EXIT, PREDATOR, BUILDER, 
-    GRAVITY_ZONE, BOMB, TELEPORTER, PILLAR, SLUDGE
+    GRAVITY_ZONE, BOMB, TELEPORTER, PILLAR, SLUDGE, TILE_CHARS
 )
+from grid import Grid
+from level_cache import pair_teleporters
+
+# Tiles a falling object can slide into, fall through, or rest on and roll off.
+OPEN_TILES = (EMPTY, GRAVITY_ZONE)
+FALL_THROUGH_TILES = (EMPTY, PREDATOR, BUILDER, GRAVITY_ZONE)
+SLIDE_BASE_TILES = (FIREWALL, KEY, WALL, PILLAR)
+# Solid tiles that cut a gravity well off from the objects above it.
+GRAVITY_BLOCKING_TILES = (WALL, PILLAR, DATA, SLUDGE)
+# Order in which viruses try their moves; the first of several equally short routes wins.
+DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+# Chance per tick that sludge spreads into an EMPTY cell, per touching sludge cell
+SLUDGE_SPREAD_CHANCE = 0.0575
+# Player inputs understood by Engine.apply_input and Engine.step
+MOVES = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+MOVE_NAMES = {move: name for name, move in MOVES.items()}
+ACTIONS = ("up", "down", "left", "right", "bomb", "pillar")
+CRUSH_GRACE = 500 # ms sous un Firewall avant d'être écrasé
+
+# Engine.snapshot() layout: header, enemies, bombs, gravity wells, Mersenne
+# Twister state, cells; the NumPy backend appends its generator state.
+SNAPSHOT_HEADER = struct.Struct("<2H?8i3q3H")
+SNAPSHOT_ENEMY = struct.Struct("<B2hq")
+SNAPSHOT_BOMB = struct.Struct("<3h")
+SNAPSHOT_ZONE = struct.Struct("<2h")
+SNAPSHOT_RNG = struct.Struct("<625Id")
+
+class Enemy:
+    """A virus or replicator tracked by the engine across moves."""
+    __slots__ = ("id", "kind", "x", "y", "next_move")
+
+    def __init__(self, enemy_id, kind, x, y, next_move=0):
+        self.id = enemy_id
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.next_move = next_move # Heure (ms) à partir de laquelle il peut rebouger
+
+
+class Player:
+    """The player's square and inventory, for games driven through the engine."""
+    __slots__ = ("x", "y", "keys", "required_keys", "bombs", "pillars", "crush_since")
+
+    def __init__(self, x, y, required_keys, bombs=5, pillars=3):
+        self.x = x
+        self.y = y
+        self.keys = 0
+        self.required_keys = required_keys
+        self.bombs = bombs
+        self.pillars = pillars
+        self.crush_since = None # Heure (ms) où un Firewall s'est posé sur lui
+
+
+class SimulatedClock:
+    """Milliseconds that only move when advanced; the default engine clock."""
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms
+
 
 class Engine:
-    def __init__(self, grid):
+    def __init__(self, grid, seed=None, backend="python", parity=False, clock=None):
         self.grid = grid
+        # Sludge and replicators draw from this generator only, so a run is
+        # reproducible from its seed
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        # Headless runs (step) move this clock; frontends pass their own time to update()
+        self.clock = clock if clock is not None else SimulatedClock()
+        self.current_time = 0 # Time of the tick being run
+        self.ticks = 0
+        self.player = None # Set by spawn_player when the engine drives the player
+        self.recorder = None # replay.Recorder logging this session, if any
+        self.stats = None # engine_stats.EngineStats while instrumentation is on
+        # Work done so far, read by the stats
+        self.cells_visited = 0
+        self.objects_moved = 0
+        self.bfs_nodes = 0
         self.last_physics_update = 0
         self.physics_delay = 150 # ms between physics ticks
         self.processed_this_tick = set()
         self.active_bombs = []
-        self.predator_timers = {} # Cache pour les délais de déplacement par prédateur (x,y) -> last_time
         self.predator_move_delay = 400 # 0.4s par case (plus rapide pour plus de challenge)
+        self.enemies = {} # id -> Enemy
+        self.enemy_at = {} # (x, y) -> Enemy
+        self.next_enemy_id = 1
         self.gravity_zones = set() # Coordonnées persistantes des puits de gravité
+        self.teleporters = {} # Portail -> portail d'arrivée (CompiledLevel.teleporters)
+        
+        # Active set: offsets of cells that may move on the next physics tick.
+        # Every tile change marks its 3x3 neighbourhood; cells that were looked
+        # at and did not move drop out, so a settled level costs nothing.
+        stride = grid.stride
+        self.neighbourhood = [dy * stride + dx for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+        self.active_cells = set()
+        self.changes = grid.watch() # Tile changes since collect_changes last looked
+        self.last_player_pos = None
+        
+        # gravity_reach[x][y] == 1 when an object at (x, y) is pulled up by a
+        # gravity well further down its column. Built on first use, then
+        # repaired column by column as tiles change.
+        self.gravity_reach = None
+        
+        # Distance from the player over EMPTY tiles, shared by every virus and
+        # repaired in place as tiles change and the player moves
+        self.player_distance = None
+        self.player_distance_origin = None
+        self.distance_changes = set()
+        
+        # EMPTY cells next to sludge -> number of sludge cells they touch
+        self.sludge_frontier = None
+        self.mark_all_active()
+        
+        # backend="numpy" runs physics, sludge and bombs on NumPy arrays;
+        # parity=True checks each of its physics ticks against this engine.
+        self.backend = None
+        if backend == "numpy":
+            try:
+                from engine_numpy import NumpyBackend
+            except ImportError as e:
+                print(f"NumPy backend unavailable ({e}), using the Python engine")
+            else:
+                self.backend = NumpyBackend(self, parity=parity)
+        elif backend != "python":
+            raise ValueError(f"Unknown engine backend: {backend}")
+
+    def mark_all_active(self):
+        """Schedule every cell of the map for the next physics tick."""
+        for y in range(self.grid.height):
+            start = self.grid.index(0, y)
+            self.active_cells.update(range(start, start + self.grid.width))
+        self.changes.drain() # Déjà couvert : tout est réveillé
+        self.invalidate_gravity()
+        self.player_distance = None
+        self.sludge_frontier = None
+
+    def collect_changes(self):
+        """Move the grid's changed cells into the active set and return the newly marked offsets."""
+        full, changes = self.changes.drain()
+        if full:
+            # La carte a été réécrite d'un bloc : on repart de zéro
+            self.mark_all_active()
+            if self.enemy_at:
+                self.sync_enemies([self.grid.index(x, y) for x, y in self.enemy_at])
+            return list(self.active_cells)
+        if not changes:
+            return ()
+        stride = self.grid.stride
+        dirty = {(y + 1) * stride + x + 1 for x, y, _, _ in changes}
+        marked = [i + offset for i in dirty for offset in self.neighbourhood]
+        if self.gravity_zones and self.gravity_reach is not None:
+            # Objects whose pull flipped may sit far above the change
+            for i in dirty:
+                marked.extend(self.update_gravity_column(i % stride - 1, i // stride - 1))
+        self.active_cells.update(marked)
+        if self.player_distance is not None:
+            self.distance_changes.update(dirty)
+        if self.enemy_at:
+            self.sync_enemies(dirty)
+        if self.sludge_frontier is not None:
+            self.update_sludge_frontier(dirty)
+        return marked
+
+    def load_enemies(self):
+        """Register every virus and replicator currently on the grid."""
+        self.enemies.clear()
+        self.enemy_at.clear()
+        for kind in (PREDATOR, BUILDER):
+            for x, y in sorted(self.grid.positions(kind), key=lambda p: (p[1], p[0])):
+                self.add_enemy(kind, x, y)
+
+    def add_enemy(self, kind, x, y):
+        next_move = self.predator_move_delay if kind == PREDATOR else 0
+        enemy = Enemy(self.next_enemy_id, kind, x, y, next_move)
+        self.next_enemy_id += 1
+        self.enemies[enemy.id] = enemy
+        self.enemy_at[(x, y)] = enemy
+        return enemy
+
+    def remove_enemy(self, enemy):
+        self.enemies.pop(enemy.id, None)
+        if self.enemy_at.get((enemy.x, enemy.y)) is enemy:
+            del self.enemy_at[(enemy.x, enemy.y)]
+
+    def sync_enemies(self, changed):
+        # Rochers, explosions et corruption écrasent les ennemis via set_tile :
+        # un ennemi dont la case ne porte plus son type est détruit.
+        stride = self.grid.stride
+        cells = self.grid.cells
+        for i in changed:
+            pos = (i % stride - 1, i // stride - 1)
+            enemy = self.enemy_at.get(pos)
+            if enemy is not None and cells[i] != enemy.kind:
+                self.remove_enemy(enemy)
+
+    def invalidate_gravity(self):
+        """Drop the gravity map; call after changing gravity_zones."""
+        self.gravity_reach = None
+
+    def build_gravity_reach(self):
+        height = self.grid.height
+        self.gravity_reach = []
+        for x in range(self.grid.width):
+            column = self.grid.column(x)
+            reach = bytearray(height + 1) # La ligne `height` (hors carte) n'attire rien
+            for y in range(height - 1, -1, -1):
+                if (x, y) in self.gravity_zones:
+                    reach[y] = 1
+                elif column[y] not in GRAVITY_BLOCKING_TILES:
+                    reach[y] = reach[y + 1]
+            self.gravity_reach.append(reach)
+
+    def update_gravity_column(self, x, y):
+        """Repair column x after a tile change at row y.
+
+        Returns the offsets of falling objects whose pull flipped.
+        """
+        reach = self.gravity_reach[x]
+        cells = self.grid.cells
+        stride = self.grid.stride
+        flipped = []
+        for ty in range(y, -1, -1):
+            i = (ty + 1) * stride + x + 1
+            if (x, ty) in self.gravity_zones:
+                pulled = 1
+            elif cells[i] in GRAVITY_BLOCKING_TILES:
+                pulled = 0
+            else:
+                pulled = reach[ty + 1]
+            if pulled == reach[ty]:
+                break # Rien ne change plus haut
+            reach[ty] = pulled
+            if cells[i] == FIREWALL or cells[i] == KEY:
+                flipped.append(i)
+        return flipped
+
+    def gravity_pulls_up(self, x, y):
+        if not self.gravity_zones:
+            return False
+        if self.gravity_reach is None:
+            self.build_gravity_reach()
+        return self.gravity_reach[x][y] == 1
+
+    def mark_player(self, player_pos):
+        # The player is not a tile, so moving it never reaches set_tile; wake
+        # up whatever was waiting on its old cell and around its new one.
+        if player_pos == self.last_player_pos:
+            return
+        for pos in (self.last_player_pos, player_pos):
+            if pos is not None:
+                i = self.grid.index(*pos)
+                self.active_cells.update(i + offset for offset in self.neighbourhood)
+        self.last_player_pos = player_pos
+
+    @classmethod
+    def from_level(cls, map_str, seed=None, clock=None, backend="python"):
+        """Headless engine for a level string, with the player spawned on 'P'."""
+        lines = map_str.strip().split('\n')
+        cells = [[TILE_CHARS.get(char, EMPTY) for char in line] for line in lines]
+        engine = cls(Grid.from_list(cells, load_graphics=False), seed=seed, backend=backend, clock=clock)
+        engine.gravity_zones.update(engine.grid.positions(GRAVITY_ZONE))
+        engine.teleporters = pair_teleporters(sorted(engine.grid.positions(TELEPORTER), key=lambda p: (p[1], p[0])))
+        engine.load_enemies()
+        for y, line in enumerate(lines):
+            if 'P' in line:
+                engine.spawn_player(line.index('P'), y)
+                break
+        else:
+            engine.spawn_player(1, 1)
+        return engine
+
+    def snapshot(self):
+        """Everything a tick depends on, as bytes: tiles, gravity wells,
+        enemies, bombs, timers, RNG and player. Caches are not included."""
+        grid = self.grid
+        player = self.player
+        version, mt, gauss = self.rng.getstate()
+        parts = [SNAPSHOT_HEADER.pack(
+            grid.width, grid.height, player is not None,
+            *((player.x, player.y, player.keys, player.required_keys, player.bombs, player.pillars,
+               -1 if player.crush_since is None else player.crush_since) if player is not None
+              else (0, 0, 0, 0, 0, 0, -1)),
+            gauss is not None,
+            self.current_time, self.last_physics_update, self.ticks,
+            len(self.enemies), len(self.active_bombs), len(self.gravity_zones))]
+        for enemy in self.enemies.values():
+            parts.append(SNAPSHOT_ENEMY.pack(enemy.kind, enemy.x, enemy.y, enemy.next_move))
+        for bomb in self.active_bombs:
+            parts.append(SNAPSHOT_BOMB.pack(*bomb))
+        for zone in sorted(self.gravity_zones):
+            parts.append(SNAPSHOT_ZONE.pack(*zone))
+        parts.append(SNAPSHOT_RNG.pack(*mt, gauss or 0.0))
+        parts.append(grid.cells)
+        if self.backend is not None:
+            parts.append(self.backend.snapshot())
+        return b"".join(parts)
+
+    def restore(self, data):
+        """Go back to a snapshot() of this level.
+
+        Only the cells that differ are written, through Grid.set_cells, so
+        the position index, the Zobrist hash and the engine's caches are
+        repaired like after any tile change; no texture is touched.
+        """
+        grid = self.grid
+        (width, height, has_player, x, y, keys, required_keys, bombs, pillars, crush_since, has_gauss,
+         current_time, last_update, ticks, n_enemies, n_bombs, n_zones) = SNAPSHOT_HEADER.unpack_from(data)
+        if (width, height) != (grid.width, grid.height):
+            raise ValueError(f"Snapshot of a {width}x{height} map, grid is {grid.width}x{grid.height}")
+        offset = SNAPSHOT_HEADER.size
+        if has_player:
+            if self.player is None:
+                self.spawn_player(x, y)
+            player = self.player
+            player.x, player.y, player.keys, player.required_keys = x, y, keys, required_keys
+            player.bombs, player.pillars = bombs, pillars
+            player.crush_since = None if crush_since < 0 else crush_since
+        self.current_time, self.last_physics_update, self.ticks = current_time, last_update, ticks
+        if isinstance(self.clock, SimulatedClock):
+            self.clock.now = current_time
+
+        self.enemies.clear()
+        self.enemy_at.clear()
+        for _ in range(n_enemies):
+            kind, ex, ey, next_move = SNAPSHOT_ENEMY.unpack_from(data, offset)
+            offset += SNAPSHOT_ENEMY.size
+            enemy = Enemy(self.next_enemy_id, kind, ex, ey, next_move)
+            self.next_enemy_id += 1
+            self.enemies[enemy.id] = enemy
+            self.enemy_at[(ex, ey)] = enemy
+        self.active_bombs = []
+        for _ in range(n_bombs):
+            self.active_bombs.append(SNAPSHOT_BOMB.unpack_from(data, offset))
+            offset += SNAPSHOT_BOMB.size
+        zones = set()
+        for _ in range(n_zones):
+            zones.add(SNAPSHOT_ZONE.unpack_from(data, offset))
+            offset += SNAPSHOT_ZONE.size
+        if zones != self.gravity_zones:
+            self.gravity_zones.clear()
+            self.gravity_zones.update(zones)
+            self.invalidate_gravity()
+        state = SNAPSHOT_RNG.unpack_from(data, offset)
+        offset += SNAPSHOT_RNG.size
+        self.rng.setstate((3, state[:-1], state[-1] if has_gauss else None))
+
+        cells = grid.cells
+        end = offset + len(cells)
+        tiles = memoryview(data)[offset:end]
+        stride = grid.stride
+        changed = []
+        for start in range(stride, len(cells) - stride, stride):
+            row_end = start + stride
+            if cells[start:row_end] != tiles[start:row_end]:
+                changed.extend(i for i in range(start, row_end) if cells[i] != tiles[i])
+        grid.set_cells(changed, [tiles[i] for i in changed])
+        grid.active_explosions.clear()
+        self.processed_this_tick.clear()
+        self.collect_changes()
+        # The active set is not part of the snapshot: wake every cell
+        for row in range(1, grid.height + 1):
+            self.active_cells.update(range(row * stride + 1, row * stride + 1 + grid.width))
+        self.last_player_pos = None
+        if self.backend is not None:
+            self.backend.restore(bytes(data[end:]))
 
     def update(self, current_time, player_pos):
         killed = False
         if current_time - self.last_physics_update > self.physics_delay:
-            killed = self.update_physics(player_pos, current_time)
-            if not killed:
-                killed = self.update_enemies(player_pos)
-            
-            bomb_killed = self.update_bombs(player_pos)
-            self.update_sludge()
-            
-            # Check if player is trapped (Stalemate)
-            trapped = self.check_trapped(*player_pos)
-            
-            killed = killed or bomb_killed or trapped
-            self.last_physics_update = current_time
+            killed = self.tick(current_time, player_pos)
         return killed
 
+    def tick(self, current_time, player_pos):
+        """One physics, enemy, bomb and sludge update at current_time (ms)."""
+        self.current_time = current_time
+        self.ticks += 1
+        stats = self.stats
+        if stats is not None:
+            stats.begin_tick(self)
+        killed = self.update_physics(player_pos, current_time)
+        if stats is not None:
+            stats.lap("physics")
+        if not killed:
+            killed = self.update_enemies(player_pos, current_time)
+        if stats is not None:
+            stats.lap("enemies")
+        
+        bomb_killed = self.update_bombs(player_pos)
+        if stats is not None:
+            stats.lap("bombs")
+        self.update_sludge()
+        if stats is not None:
+            stats.lap("sludge")
+        
+        # Check if player is trapped (Stalemate)
+        trapped = self.check_trapped(*player_pos)
+        if stats is not None:
+            stats.lap("trapped")
+            stats.end_tick(self)
+        
+        self.last_physics_update = current_time
+        if self.recorder is not None:
+            self.recorder.tick(self)
+        return killed or bomb_killed or trapped
+
+    def step(self, n_ticks=1, inputs=()):
+        """Run n_ticks fixed ticks on the engine clock, without any UI.
+
+        inputs[t] (a sequence, or a dict for sparse input) is the action fed
+        to apply_input before tick t; None means no input. Stops early and
+        returns "dead" or "won"; returns None if the player is still playing.
+        """
+        player = self.player
+        sparse = isinstance(inputs, dict)
+        for t in range(n_ticks):
+            action = inputs.get(t) if sparse else (inputs[t] if t < len(inputs) else None)
+            if action is not None:
+                outcome = self.apply_input(action)
+                if outcome == "dead" or outcome == "won":
+                    return outcome
+            self.clock.advance(self.physics_delay + 1)
+            now = self.clock()
+            if self.tick(now, (player.x, player.y)) or self.crushed(now):
+                return "dead"
+        return None
+
+    def spawn_player(self, x, y, bombs=5, pillars=3):
+        self.player = Player(x, y, max(1, self.grid.count(KEY)), bombs, pillars)
+        self.grid.player = self.player # Folded into grid.zobrist
+        return self.player
+
+    def crushed(self, current_time):
+        """Firewall grace delay: True once one has rested on the player too long."""
+        player = self.player
+        if not self.check_crush(player.x, player.y):
+            player.crush_since = None
+            return False
+        if player.crush_since is None:
+            player.crush_since = current_time
+            return False
+        return current_time - player.crush_since > CRUSH_GRACE
+
+    def apply_input(self, action):
+        """Feed one of ACTIONS to the player; returns the outcome like move_player."""
+        if action == "bomb":
+            return "placed" if self.place_bomb() else "blocked"
+        if action == "pillar":
+            return "placed" if self.place_pillar() else "blocked"
+        dx, dy = MOVES[action]
+        # Descendre sous un Firewall qui appuie déjà : mort immédiate
+        if dy > 0 and self.check_crush(self.player.x, self.player.y):
+            return "dead"
+        return self.move_player(dx, dy)
+
+    def move_player(self, dx, dy):
+        """Move the player by (dx, dy) with the game's rules.
+
+        Returns "blocked", "moved", "key", "teleported", "won" or "dead".
+        """
+        if self.recorder is not None:
+            self.recorder.input(self, MOVE_NAMES[(dx, dy)])
+        player = self.player
+        grid = self.grid
+        new_x = player.x + dx
+        new_y = player.y + dy
+        target_tile = grid.get_tile(new_x, new_y)
+        
+        if target_tile == WALL or target_tile == PILLAR:
+            return "blocked"
+        
+        if target_tile == TELEPORTER:
+            target = self.teleporters.get((new_x, new_y))
+            if target is None or grid.get_tile(*target) != TELEPORTER:
+                # Portail d'arrivée détruit (ou paires inconnues) : premier autre
+                # portail dans l'ordre de lecture de la carte, comme pair_teleporters
+                portals = sorted(grid.positions(TELEPORTER), key=lambda p: (p[1], p[0]))
+                target = next((p for p in portals if p != (new_x, new_y)), None)
+                if target is None:
+                    return "blocked"
+            player.x, player.y = target
+            return "teleported"
+        
+        if target_tile == KEY:
+            player.keys += 1
+            player.x, player.y = new_x, new_y
+            grid.set_tile(new_x, new_y, EMPTY)
+            return "key"
+        if target_tile == EXIT:
+            if player.keys >= player.required_keys:
+                player.x, player.y = new_x, new_y
+                return "won"
+            return "blocked"
+        if target_tile == PREDATOR or target_tile == SLUDGE:
+            player.x, player.y = new_x, new_y # Contact mortel
+            return "dead"
+        if target_tile == DATA or target_tile == EMPTY:
+            player.x, player.y = new_x, new_y
+            grid.set_tile(new_x, new_y, EMPTY)
+            return "moved"
+        if target_tile == FIREWALL and dy == 0:
+            if grid.get_tile(new_x + dx, new_y) in OPEN_TILES:
+                grid.set_tile(new_x + dx, new_y, FIREWALL)
+                # Restaurer le tile d'origine s'il s'agissait d'une zone de gravité
+                grid.set_tile(new_x, new_y, GRAVITY_ZONE if (new_x, new_y) in self.gravity_zones else EMPTY)
+                player.x, player.y = new_x, new_y
+                return "moved"
+        return "blocked"
+
+    def place_bomb(self):
+        player = self.player
+        if player.bombs <= 0:
+            return False
+        if self.recorder is not None:
+            self.recorder.input(self, "bomb")
+        self.active_bombs.append((player.x, player.y, 10))
+        self.grid.set_tile(player.x, player.y, BOMB)
+        player.bombs -= 1
+        return True
+
+    def place_pillar(self):
+        player = self.player
+        if player.pillars <= 0:
+            return False
+        if self.recorder is not None:
+            self.recorder.input(self, "pillar")
+        self.grid.set_tile(player.x, player.y, PILLAR)
+        player.pillars -= 1
+        return True
+
     def check_trapped(self, px, py):
         # A player is trapped if no adjacent tile allows movement
         for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
@@ -57,20 +567,68 @@ class Engine:
             return True
         return False
 
+    def frontier_size(self):
+        """EMPTY cells next to sludge, on either backend (for the stats)."""
+        if self.backend is not None:
+            return self.backend.frontier_size
+        return len(self.sludge_frontier) if self.sludge_frontier is not None else 0
+
+    def build_sludge_frontier(self):
+        self.sludge_frontier = {}
+        self.update_sludge_frontier(self.grid.index(x, y) for x, y in self.grid.positions(SLUDGE))
+
+    def update_sludge_frontier(self, changed):
+        """Recount the frontier around changed cells."""
+        cells = self.grid.cells
+        stride = self.grid.stride
+        frontier = self.sludge_frontier
+        for i in changed:
+            for j in (i, i + stride, i - stride, i + 1, i - 1):
+                if cells[j] == EMPTY:
+                    touching = ((cells[j + stride] == SLUDGE) + (cells[j - stride] == SLUDGE)
+                                + (cells[j + 1] == SLUDGE) + (cells[j - 1] == SLUDGE))
+                    if touching:
+                        frontier[j] = touching
+                        continue
+                frontier.pop(j, None)
+
     def update_sludge(self):
-        expand_targets = []
-        for y in range(1, self.grid.height - 1):
-            for x in range(1, self.grid.width - 1):
-                if self.grid.get_tile(x, y) == SLUDGE:
-                    for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                        if self.grid.get_tile(x + dx, y + dy) == EMPTY:
-                            expand_targets.append((x + dx, y + dy))
+        if self.backend is not None:
+            return self.backend.update_sludge()
+        if not self.grid.count(SLUDGE):
+            self.sludge_frontier = None
+            return
+        if self.sludge_frontier is None:
+            self.build_sludge_frontier()
+        else:
+            self.collect_changes()
+        
+        # Each touching sludge cell is one chance to spread. Instead of one
+        # draw per chance, jump straight to the next cell that gets corrupted
+        # (geometric gaps), so a tick costs a few draws however long the
+        # frontier is.
+        by_touching = {}
+        for i, touching in self.sludge_frontier.items():
+            by_touching.setdefault(touching, []).append(i)
         
-        for tx, ty in expand_targets:
-            if random.random() < 0.0575:
-                self.grid.set_tile(tx, ty, SLUDGE)
+        spread = []
+        for touching, targets in sorted(by_touching.items()):
+            targets.sort()
+            log_miss = touching * math.log(1.0 - SLUDGE_SPREAD_CHANCE)
+            k = -1
+            while True:
+                k += 1 + int(math.log(1.0 - self.rng.random()) / log_miss)
+                if k >= len(targets):
+                    break
+                spread.append(targets[k])
+        
+        stride = self.grid.stride
+        for i in spread:
+            self.grid.set_tile(i % stride - 1, i // stride - 1, SLUDGE)
 
     def update_bombs(self, player_pos):
+        if self.backend is not None:
+            return self.backend.update_bombs(player_pos)
         bombs_to_remove = []
         any_killed = False
         for i, (bx, by, timer) in enumerate(self.active_bombs):
@@ -87,7 +645,7 @@ class Engine:
 
     def explode(self, bx, by, player_pos):
         # Trigger visual effect
-        self.grid.add_explosion(bx, by)
+        self.grid.add_explosion(bx, by, self.current_time)
         
         player_killed = False
         for dy in range(-1, 2):
@@ -104,74 +662,241 @@ class Engine:
         # Les Virus détectent TOUJOURS le joueur (vision omnidirectionnelle)
         return True
 
-    def find_path_to_player(self, start_x, start_y, target_x, target_y):
-        """BFS pathfinding for viruses to navigate around obstacles to reach player."""
-        from collections import deque
-        
-        # BFS to find shortest path
-        queue = deque([(start_x, start_y, [])])
-        visited = {(start_x, start_y)}
+    def build_player_distance(self, target_x, target_y):
+        """BFS outward from the player over EMPTY tiles, once for all viruses."""
+        cells = self.grid.cells
+        stride = self.grid.stride
+        distance = array('i', [-1]) * len(cells) # -1 : injoignable
+        start = self.grid.index(target_x, target_y)
+        distance[start] = 0
+        queue = deque([start])
+        steps = (stride, -stride, 1, -1)
         
+        expanded = 0
         while queue:
-            x, y, path = queue.popleft()
-            
-            # Found the target
-            if x == target_x and y == target_y:
-                return path[0] if path else (0, 0)
-            
-            # Try all 4 directions
-            for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                nx, ny = x + dx, y + dy
-                
-                if (nx, ny) in visited:
-                    continue
-                
-                # Check bounds
-                if not (0 <= nx < self.grid.width and 0 <= ny < self.grid.height):
-                    continue
-                
-                tile = self.grid.get_tile(nx, ny)
-                
+            i = queue.popleft()
+            expanded += 1
+            d = distance[i] + 1
+            for step in steps:
+                j = i + step
                 # CRITICAL: Viruses can ONLY move through EMPTY tiles
-                # They must navigate around DATA, WALLS, FIREWALLS, etc.
-                # Exception: Can move to player position
-                if tile != EMPTY and (nx, ny) != (target_x, target_y):
-                    continue
-                
-                visited.add((nx, ny))
-                new_path = path + [(dx, dy)]
-                queue.append((nx, ny, new_path))
+                # The WALL sentinel ring keeps the search inside the map
+                if distance[j] < 0 and cells[j] == EMPTY:
+                    distance[j] = d
+                    queue.append(j)
         
-        # No path found, return no movement
-        return (0, 0)
+        self.player_distance = distance
+        self.player_distance_origin = start
+        self.distance_changes.clear()
+        self.bfs_nodes += expanded
+
+    def update_player_distance(self, target_x, target_y):
+        """Bring the distance field up to date with the grid and the player.
+
+        Only the distances touched by the changes since the last call are
+        recomputed, so a dug cell or a single step costs what it changes.
+        """
+        if self.player_distance is None:
+            self.build_player_distance(target_x, target_y)
+            return
+        cells = self.grid.cells
+        distance = self.player_distance
+        origin = self.player_distance_origin
+        
+        if self.distance_changes:
+            blocked, opened = [], []
+            for i in self.distance_changes:
+                if i == origin:
+                    continue # Le joueur reste traversable quoi qu'il y ait sous lui
+                if cells[i] == EMPTY:
+                    if distance[i] < 0:
+                        opened.append(i)
+                elif distance[i] >= 0:
+                    blocked.append(i)
+            self.distance_changes.clear()
+            if blocked:
+                self.raise_distances(blocked, origin, set(opened))
+            seeds = []
+            for i in opened:
+                best = self.best_neighbour_distance(i)
+                if best >= 0:
+                    seeds.append((best + 1, i))
+            self.relax_distances(seeds, origin)
+        
+        target = self.grid.index(target_x, target_y)
+        if target != origin:
+            # Le joueur a bougé : tout ce qui est plus près de lui baisse,
+            # puis ce qui ne tenait qu'à son ancienne case remonte.
+            self.player_distance_origin = target
+            self.relax_distances([(0, target)], target)
+            self.raise_distances([origin], target)
+
+    def best_neighbour_distance(self, i):
+        stride = self.grid.stride
+        best = -1
+        for j in (i + stride, i - stride, i + 1, i - 1):
+            d = self.player_distance[j]
+            if d >= 0 and (best < 0 or d < best):
+                best = d
+        return best
+
+    def raise_distances(self, sources, origin, excluded=()):
+        """Recompute the distances that were routed through sources."""
+        distance = self.player_distance
+        stride = self.grid.stride
+        steps = (stride, -stride, 1, -1)
+        # Every cell whose shortest route ran through a source sits on a
+        # chain of +1 steps from it; forget them all, then refill from the
+        # cells around them that were not affected.
+        affected = set(sources)
+        stack = list(sources)
+        while stack:
+            i = stack.pop()
+            d = distance[i] + 1
+            for step in steps:
+                j = i + step
+                if distance[j] == d and j not in affected:
+                    affected.add(j)
+                    stack.append(j)
+        for i in affected:
+            distance[i] = -1
+        self.bfs_nodes += len(affected)
+        
+        cells = self.grid.cells
+        seeds = []
+        for i in affected:
+            if i == origin or (cells[i] == EMPTY and i not in excluded):
+                best = self.best_neighbour_distance(i)
+                if best >= 0:
+                    seeds.append((best + 1, i))
+        self.relax_distances(seeds, origin, excluded)
+
+    def relax_distances(self, seeds, origin, excluded=()):
+        """Lower distances outward from seeds of (distance, offset)."""
+        cells = self.grid.cells
+        distance = self.player_distance
+        stride = self.grid.stride
+        steps = (stride, -stride, 1, -1)
+        heap = list(seeds)
+        heapq.heapify(heap)
+        expanded = 0
+        while heap:
+            d, i = heapq.heappop(heap)
+            if 0 <= distance[i] <= d:
+                continue
+            distance[i] = d
+            expanded += 1
+            d += 1
+            for step in steps:
+                j = i + step
+                if (distance[j] < 0 or distance[j] > d) and (cells[j] == EMPTY or j == origin) and j not in excluded:
+                    heapq.heappush(heap, (d, j))
+        self.bfs_nodes += expanded
+
+    def find_path_to_player(self, start_x, start_y, target_x, target_y):
+        """First step of a shortest path from a virus to the player, or (0, 0)."""
+        if (start_x, start_y) == (target_x, target_y):
+            return (0, 0)
+        self.collect_changes()
+        self.update_player_distance(target_x, target_y)
+        
+        stride = self.grid.stride
+        distance = self.player_distance
+        start = self.grid.index(start_x, start_y)
+        best, best_distance = (0, 0), None
+        for dx, dy in DIRECTIONS:
+            d = distance[start + dy * stride + dx]
+            if d >= 0 and (best_distance is None or d < best_distance):
+                best, best_distance = (dx, dy), d
+        
+        # No path found (d < 0 everywhere around): stop right away
+        return best
 
     def update_physics(self, player_pos, current_time):
+        if self.backend is not None:
+            return self.backend.update_physics(player_pos, current_time)
         self.processed_this_tick.clear()
+        self.mark_player(player_pos)
+        self.collect_changes()
+        if not self.active_cells:
+            return False # Tout est stable : la physique dort
+        
         player_killed = False
+        grid = self.grid
+        cells = grid.cells
+        stride = grid.stride
+        processed = self.processed_this_tick
         
-        for y in range(self.grid.height - 2, 0, -1):
-            for x in range(1, self.grid.width - 1):
-                if (x, y) in self.processed_this_tick:
-                    continue
-                
-                tile = self.grid.get_tile(x, y)
-                if tile in [FIREWALL, KEY]:
-                    # On passe current_time pour gérer le délai de grâce si au-dessus du joueur
+        if 2 * len(self.active_cells) > grid.width * grid.height:
+            # Most of the map is awake (e.g. right after loading): a plain
+            # sweep is cheaper than ordering the active cells.
+            self.active_cells = set()
+            moved = 0
+            for y in range(grid.height - 2, 0, -1):
+                base = (y + 1) * stride + 1
+                for x in range(1, grid.width - 1):
+                    tile = cells[base + x]
+                    if tile != FIREWALL and tile != KEY:
+                        continue
+                    if (x, y) in processed:
+                        continue
                     if self.process_falling_object(x, y, player_pos, current_time):
+                        moved += 1
                         if player_pos == (x, y + 1) and tile == FIREWALL:
                             player_killed = True
+            self.cells_visited += (grid.height - 2) * (grid.width - 2)
+            self.objects_moved += moved
+            self.collect_changes()
+            return player_killed
+        
+        # Scan keys grow in the order the full sweep visits cells: bottom row
+        # first, left to right. Cells woken up by a move ahead of the current
+        # key are pushed back in, so results match a sweep of the whole map.
+        last_row = grid.height + 1
+        pending = [(last_row - i // stride) * stride + i % stride for i in self.active_cells]
+        self.active_cells = set()
+        heapq.heapify(pending)
+        previous = -1
+        visited = moved = 0
+        
+        while pending:
+            key = heapq.heappop(pending)
+            if key == previous:
+                continue
+            previous = key
+            visited += 1
+            y = grid.height - key // stride
+            x = key % stride - 1
+            if not (0 < y < grid.height - 1 and 0 < x < grid.width - 1):
+                continue
+            tile = cells[(y + 1) * stride + x + 1]
+            if tile != FIREWALL and tile != KEY:
+                continue
+            if (x, y) in processed:
+                continue
+            # On passe current_time pour gérer le délai de grâce si au-dessus du joueur
+            if self.process_falling_object(x, y, player_pos, current_time):
+                moved += 1
+                if player_pos == (x, y + 1) and tile == FIREWALL:
+                    player_killed = True
+            for i in self.collect_changes():
+                woken = (last_row - i // stride) * stride + i % stride
+                if woken > key:
+                    heapq.heappush(pending, woken)
+        self.cells_visited += visited
+        self.objects_moved += moved
         return player_killed
 
-    def update_enemies(self, player_pos):
+    def update_enemies(self, player_pos, current_time):
         player_killed = False
-        enemies = []
-        for y in range(self.grid.height):
-            for x in range(self.grid.width):
-                tile = self.grid.get_tile(x, y)
-                if tile in [PREDATOR, BUILDER]:
-                    enemies.append((x, y, tile))
+        self.collect_changes()
+        # Même ordre que le balayage ligne par ligne
+        enemies = sorted(self.enemies.values(), key=lambda e: (e.y, e.x))
         
-        for ex, ey, etype in enemies:
+        for enemy in enemies:
+            if enemy.id not in self.enemies:
+                continue # Détruit plus tôt dans ce tick
+            ex, ey, etype = enemy.x, enemy.y, enemy.kind
             if (ex, ey) in self.processed_this_tick:
                 continue
                 
@@ -182,17 +907,15 @@ class Engine:
                     continue
                     
                 # 2. Vérifier le timer de vitesse (0.4s par case)
-                current_time = pygame.time.get_ticks()
-                last_move = self.predator_timers.get((ex, ey), 0)
-                if current_time - last_move < self.predator_move_delay:
+                if current_time < enemy.next_move:
                     continue
                 
                 # 3. Use pathfinding to navigate around obstacles
                 dx, dy = self.find_path_to_player(ex, ey, player_pos[0], player_pos[1])
             
             elif etype == BUILDER:
-                dirs = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-                random.shuffle(dirs)
+                dirs = list(DIRECTIONS)
+                self.rng.shuffle(dirs)
                 for rdx, rdy in dirs:
                     if self.grid.get_tile(ex + rdx, ey + rdy) == EMPTY:
                         dx, dy = rdx, rdy
@@ -209,12 +932,14 @@ class Engine:
                         player_killed = True
                     
                     # Dans tous les cas, on avance (visuel)
+                    self.move_enemy(enemy, target_pos)
                     self.grid.set_tile(ex, ey, EMPTY)
                     self.grid.set_tile(*target_pos, PREDATOR)
                     self.processed_this_tick.add(target_pos)
                 
                 # Priorité 2 : Mouvement normal
                 elif target_tile == EMPTY:
+                    self.move_enemy(enemy, target_pos)
                     # Effacer l'ancienne position
                     old_tile = GRAVITY_ZONE if (ex, ey) in self.gravity_zones else EMPTY
                     self.grid.set_tile(ex, ey, old_tile)
@@ -223,49 +948,54 @@ class Engine:
                         self.grid.set_tile(ex, ey, DATA) # Le builder laisse de la donnée
                     
                     if etype == PREDATOR:
-                        self.predator_timers[target_pos] = pygame.time.get_ticks()
-                        # Nettoyer l'ancien timer
-                        self.predator_timers.pop((ex, ey), None)
+                        enemy.next_move = current_time + self.predator_move_delay
                     
                     self.grid.set_tile(*target_pos, etype)
                     self.processed_this_tick.add(target_pos)
         return player_killed
 
+    def move_enemy(self, enemy, target_pos):
+        occupant = self.enemy_at.get(target_pos)
+        if occupant is not None:
+            self.remove_enemy(occupant) # Écrasé par l'arrivant (virus sur le joueur)
+        if self.enemy_at.get((enemy.x, enemy.y)) is enemy:
+            del self.enemy_at[(enemy.x, enemy.y)]
+        enemy.x, enemy.y = target_pos
+        self.enemy_at[target_pos] = enemy
+
     def process_falling_object(self, x, y, player_pos, current_time=0):
-        tile_type = self.grid.get_tile(x, y)
+        grid = self.grid
+        cells = grid.cells
+        stride = grid.stride
+        i = (y + 1) * stride + x + 1
+        tile_type = cells[i]
         # gravity_up: un objet monte s'il y a un puit de gravité ('G') n'importe où en dessous
         # dans la même colonne, tant qu'il n'y a pas d'obstacle solide entre les deux.
-        gravity_up = False
-        for ty in range(y, self.grid.height):
-            if (x, ty) in self.gravity_zones:
-                gravity_up = True
-                break
-                t = self.grid.get_tile(x, ty)
-                # Seuls les obstacles solides (murs, terre) bloquent la gravité.
-                # Les objets tombables (Firewall, Key) ne bloquent pas la gravité pour les objets au dessus.
-                if t in [WALL, PILLAR, DATA, SLUDGE]:
-                    break
+        # Seuls les obstacles solides (murs, terre) bloquent la gravité.
+        # Les objets tombables (Firewall, Key) ne bloquent pas la gravité pour les objets au dessus.
+        gravity_up = self.gravity_pulls_up(x, y)
+        
+        # Restaurer le tile d'origine s'il s'agissait d'une zone de gravité
+        original_tile = GRAVITY_ZONE if (x, y) in self.gravity_zones else EMPTY
         
         if gravity_up:
             target_pos = (x, y - 1)
-            target = self.grid.get_tile(*target_pos)
-            if target in [EMPTY, GRAVITY_ZONE] or target_pos == player_pos:
+            target = cells[i - stride]
+            if target in OPEN_TILES or target_pos == player_pos:
                 # Si le joueur est au-dessus et que c'est une pierre -> Mort (mais on laisse check_crush gérer le délai ?)
                 if target_pos == player_pos:
                     if tile_type == FIREWALL:
                         return True 
                     return False 
                 
-                # Restaurer le tile d'origine s'il s'agissait d'une zone de gravité
-                original_tile = GRAVITY_ZONE if (x, y) in self.gravity_zones else EMPTY
-                self.grid.set_tile(x, y, original_tile)
-                self.grid.set_tile(target_pos[0], target_pos[1], tile_type)
+                grid.set_tile(x, y, original_tile)
+                grid.set_tile(x, y - 1, tile_type)
                 self.processed_this_tick.add(target_pos)
                 return True
             return False
 
         target_pos = (x, y + 1)
-        target_tile = self.grid.get_tile(*target_pos)
+        below = cells[i + stride]
 
         # SI LE JOUEUR EST EN DESSOUS : On ne tombe QUE si le délai de grâce est dépassé (géré dans main.py)
         # Mais le moteur doit quand même savoir s'il doit déplacer l'objet.
@@ -279,28 +1009,23 @@ class Engine:
             # que quand killed deviendra True dans main.py.
             return False
 
-        if target_tile in [EMPTY, PREDATOR, BUILDER, GRAVITY_ZONE]:
-            # Restaurer le tile d'origine s'il s'agissait d'une zone de gravité
-            original_tile = GRAVITY_ZONE if (x, y) in self.gravity_zones else EMPTY
-            self.grid.set_tile(x, y, original_tile)
-            self.grid.set_tile(*target_pos, tile_type)
+        if below in FALL_THROUGH_TILES:
+            grid.set_tile(x, y, original_tile)
+            grid.set_tile(x, y + 1, tile_type)
             self.processed_this_tick.add(target_pos)
             return True
             
-        below = self.grid.get_tile(x, y + 1)
-        if below in [FIREWALL, KEY, WALL, PILLAR]:
-            if self.grid.get_tile(x - 1, y) in [EMPTY, GRAVITY_ZONE] and self.grid.get_tile(x - 1, y + 1) in [EMPTY, GRAVITY_ZONE]:
+        if below in SLIDE_BASE_TILES:
+            if cells[i - 1] in OPEN_TILES and cells[i - 1 + stride] in OPEN_TILES:
                 if (x - 1, y + 1) != player_pos:
-                    original_tile = GRAVITY_ZONE if (x, y) in self.gravity_zones else EMPTY
-                    self.grid.set_tile(x, y, original_tile)
-                    self.grid.set_tile(x - 1, y, tile_type)
+                    grid.set_tile(x, y, original_tile)
+                    grid.set_tile(x - 1, y, tile_type)
                     self.processed_this_tick.add((x - 1, y))
                     return True
-            if self.grid.get_tile(x + 1, y) in [EMPTY, GRAVITY_ZONE] and self.grid.get_tile(x + 1, y + 1) in [EMPTY, GRAVITY_ZONE]:
+            if cells[i + 1] in OPEN_TILES and cells[i + 1 + stride] in OPEN_TILES:
                 if (x + 1, y + 1) != player_pos:
-                    original_tile = GRAVITY_ZONE if (x, y) in self.gravity_zones else EMPTY
-                    self.grid.set_tile(x, y, original_tile)
-                    self.grid.set_tile(x + 1, y, tile_type)
+                    grid.set_tile(x, y, original_tile)
+                    grid.set_tile(x + 1, y, tile_type)
                     self.processed_this_tick.add((x + 1, y))
                     return True
         return False
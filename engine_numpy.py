@@ -0,0 +1,223 @@
+"""
+NumPy backend for the Boulderflash engine.
+Runs physics, sludge and bombs on whole rows of the grid at once; meant for
+headless batch runs and large generated maps.
+"""
+import json
+
+import numpy as np
+from constants import EMPTY, WALL, FIREWALL, KEY, GRAVITY_ZONE, SLUDGE
+from engine import (
+    OPEN_TILES, FALL_THROUGH_TILES, SLIDE_BASE_TILES, GRAVITY_BLOCKING_TILES,
+    SLUDGE_SPREAD_CHANCE
+)
+
+# Lookup tables: TILE_LUT[row] is a boolean mask of the row's tiles in the set
+def lookup(tiles):
+    table = np.zeros(256, dtype=bool)
+    table[list(tiles)] = True
+    return table
+
+IS_OPEN = lookup(OPEN_TILES)
+IS_FALL_THROUGH = lookup(FALL_THROUGH_TILES)
+IS_SLIDE_BASE = lookup(SLIDE_BASE_TILES)
+IS_GRAVITY_BLOCKING = lookup(GRAVITY_BLOCKING_TILES)
+
+
+class NumpyBackend:
+    """Vectorized update_physics / update_sludge / update_bombs for an Engine.
+
+    The array is a live view of grid.cells (sentinel ring included), and
+    every change still goes through grid.set_tile, so the engine's enemy
+    registry, distance field and the renderer see the same updates as with
+    the Python engine. With parity on, each physics tick is replayed by the
+    sequential engine on a copy of the grid and any difference raises.
+    """
+
+    def __init__(self, engine, parity=False):
+        self.engine = engine
+        self.grid = engine.grid
+        self.parity = parity
+        self.cells = np.frombuffer(self.grid.cells, dtype=np.uint8).reshape(
+            self.grid.height + 2, self.grid.stride)
+        self.rng = np.random.default_rng(engine.seed)
+        self.frontier_size = 0 # EMPTY cells next to sludge at the last sludge step (stats)
+
+    def snapshot(self):
+        """The generator state, for Engine.snapshot()."""
+        return json.dumps(self.rng.bit_generator.state).encode()
+
+    def restore(self, data):
+        self.rng.bit_generator.state = json.loads(data)
+
+    def apply(self, work):
+        """Write the cells where work differs from the grid through set_tile."""
+        changed = np.flatnonzero(work != self.cells)
+        if len(changed):
+            self.grid.set_cells(changed.tolist(), work.flat[changed].tolist())
+
+    def update_physics(self, player_pos, current_time):
+        engine = self.engine
+        engine.processed_this_tick.clear()
+        engine.mark_player(player_pos)
+        engine.collect_changes()
+        if not engine.active_cells:
+            return False # Tout est stable : la physique dort
+        engine.active_cells = set()
+
+        if self.parity:
+            shadow = self.shadow_engine()
+            expected = shadow.update_physics(player_pos, current_time)
+
+        player_killed = self.sweep(player_pos)
+        engine.collect_changes()
+
+        if self.parity:
+            diff = np.flatnonzero(self.cells.ravel() != np.frombuffer(shadow.grid.cells, dtype=np.uint8))
+            if len(diff) or player_killed != expected:
+                stride = self.grid.stride
+                where = [(i % stride - 1, i // stride - 1) for i in diff[:5].tolist()]
+                raise RuntimeError(f"NumPy physics diverged from the sequential engine at {where} "
+                                   f"(killed {player_killed}, expected {expected})")
+        return player_killed
+
+    def shadow_engine(self):
+        from engine import Engine
+        from grid import Grid
+        shadow = Engine(Grid.from_list(self.grid.tiles, load_graphics=False), backend="python")
+        shadow.gravity_zones.update(self.engine.gravity_zones)
+        return shadow
+
+    def sweep(self, player_pos):
+        """One physics tick, row by row from the bottom like the sequential sweep.
+
+        Rows must stay in order (a falling stack moves as a whole), but inside
+        a row only slides can depend on each other: falls and upward moves
+        are decided for the whole row from the row below, then slide
+        candidates are settled left to right.
+        """
+        grid = self.grid
+        work = self.cells.copy()
+        rows, stride = work.shape
+        px, py = player_pos[0] + 1, player_pos[1] + 1
+
+        zones = np.zeros(work.shape, dtype=bool)
+        for x, y in self.engine.gravity_zones:
+            zones[y + 1, x + 1] = True
+        restore = np.where(zones, GRAVITY_ZONE, EMPTY).astype(np.uint8)
+        reach = np.zeros(work.shape, dtype=bool)
+        if self.engine.gravity_zones:
+            # Falling objects never block gravity, so the map holds for the whole tick
+            open_to_gravity = ~IS_GRAVITY_BLOCKING[work]
+            for r in range(rows - 2, -1, -1):
+                reach[r] = zones[r] | (open_to_gravity[r] & reach[r + 1])
+
+        inside = np.zeros(stride, dtype=bool)
+        inside[2:grid.width] = True
+        arrived = np.zeros(stride, dtype=bool) # Objets montés depuis la ligne du dessous
+        player_killed = False
+        moved = 0
+
+        for r in range(grid.height - 1, 1, -1):
+            start = work[r].copy()
+            movable = ((start == FIREWALL) | (start == KEY)) & inside & ~arrived
+            arrived = np.zeros(stride, dtype=bool)
+            if not movable.any():
+                continue
+            below = work[r + 1].copy()
+            player_below = np.zeros(stride, dtype=bool)
+            if py == r + 1:
+                player_below[px] = True
+
+            up = movable & reach[r]
+            if up.any():
+                room = IS_OPEN[work[r - 1]]
+                if py == r - 1:
+                    room[px] = False
+                up &= room
+                work[r - 1, up] = start[up]
+                work[r, up] = restore[r, up]
+                arrived = up
+                moved += int(up.sum())
+
+            down = movable & ~reach[r] & ~player_below
+            fall = down & IS_FALL_THROUGH[below]
+            work[r + 1, fall] = start[fall]
+            work[r, fall] = restore[r, fall]
+            moved += int(fall.sum())
+
+            if py == r + 1 and up[px] and start[px] == FIREWALL:
+                player_killed = True
+
+            slide = down & ~fall & IS_SLIDE_BASE[below]
+            if not slide.any():
+                continue
+            # Right-hand cells still hold their values from the start of the
+            # row when the sequential sweep gets there; left-hand ones may
+            # already have been changed by moves in this row.
+            right_open = np.zeros(stride, dtype=bool)
+            right_open[:-1] = IS_OPEN[start[1:]] & IS_OPEN[below[1:]] & ~player_below[1:]
+            current = work[r].tolist()
+            under = work[r + 1].tolist()
+            for c in np.flatnonzero(slide).tolist():
+                if current[c - 1] in OPEN_TILES and under[c - 1] in OPEN_TILES and not (py == r + 1 and px == c - 1):
+                    current[c - 1] = current[c]
+                elif right_open[c]:
+                    current[c + 1] = current[c]
+                else:
+                    continue
+                current[c] = restore[r, c]
+                moved += 1
+            work[r] = current
+
+        self.apply(work)
+        self.engine.cells_visited += (grid.height - 2) * (grid.width - 2)
+        self.engine.objects_moved += moved
+        return player_killed
+
+    def update_sludge(self):
+        if not self.grid.count(SLUDGE):
+            self.frontier_size = 0
+            return
+        sludge = (self.cells == SLUDGE).astype(np.int8)
+        touching = np.zeros(self.cells.shape, dtype=np.int8)
+        touching[1:-1, 1:-1] = (sludge[2:, 1:-1] + sludge[:-2, 1:-1]
+                                + sludge[1:-1, 2:] + sludge[1:-1, :-2])
+        targets = np.flatnonzero((self.cells == EMPTY) & (touching > 0))
+        self.frontier_size = len(targets)
+        if not len(targets):
+            return
+        # Each touching sludge cell is one chance to spread, as in the Python engine
+        chance = 1.0 - (1.0 - SLUDGE_SPREAD_CHANCE) ** touching.flat[targets]
+        work = self.cells.copy()
+        work.flat[targets[self.rng.random(len(targets)) < chance]] = SLUDGE
+        self.apply(work)
+
+    def update_bombs(self, player_pos):
+        engine = self.engine
+        remaining = []
+        centres = np.zeros(self.cells.shape, dtype=bool)
+        for bx, by, timer in engine.active_bombs:
+            if timer > 0:
+                remaining.append((bx, by, timer - 1))
+            else:
+                self.grid.add_explosion(bx, by, engine.current_time)
+                centres[by + 1, bx + 1] = True
+        engine.active_bombs[:] = remaining
+        if not centres.any():
+            return False
+
+        # Spread every exploding bomb over its 3x3 block in one go
+        blast = centres.copy()
+        blast[1:, :] |= centres[:-1, :]
+        blast[:-1, :] |= centres[1:, :]
+        rows = blast.copy()
+        blast[:, 1:] |= rows[:, :-1]
+        blast[:, :-1] |= rows[:, 1:]
+        blast &= self.cells != WALL
+
+        player_killed = bool(blast[player_pos[1] + 1, player_pos[0] + 1])
+        work = self.cells.copy()
+        work[blast] = EMPTY
+        self.apply(work)
+        return player_killed
@@ -0,0 +1,82 @@
+"""
+Engine instrumentation for Boulderflash.
+Per-subsystem tick timings and work counters, kept as rolling histograms
+over the last ticks. Attach an EngineStats to engine.stats to switch it on;
+with engine.stats left at None the engine skips all of this.
+"""
+import time
+from collections import deque
+
+TIMERS = ("physics", "enemies", "bombs", "sludge", "trapped", "tick")
+COUNTERS = ("cells_visited", "objects_moved", "bfs_nodes", "sludge_frontier")
+
+
+class RollingHistogram:
+    """The last `size` samples of one metric."""
+    __slots__ = ("samples",)
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self):
+        return {
+            "p50": self.percentile(0.50),
+            "p99": self.percentile(0.99),
+            "max": max(self.samples, default=0),
+        }
+
+
+class EngineStats:
+    """Timings (ms) and work counters per tick, over the last `window` ticks."""
+
+    def __init__(self, window=240):
+        self.histograms = {name: RollingHistogram(window) for name in TIMERS + COUNTERS}
+        self.ticks = 0
+        self.tick_start = 0
+        self.lap_start = 0
+        self.work_start = (0, 0, 0)
+
+    def begin_tick(self, engine):
+        self.work_start = (engine.cells_visited, engine.objects_moved, engine.bfs_nodes)
+        self.tick_start = self.lap_start = time.perf_counter()
+
+    def lap(self, name):
+        """Time since the previous lap goes to `name`."""
+        now = time.perf_counter()
+        self.histograms[name].add((now - self.lap_start) * 1000)
+        self.lap_start = now
+
+    def end_tick(self, engine):
+        histograms = self.histograms
+        histograms["tick"].add((time.perf_counter() - self.tick_start) * 1000)
+        visited, moved, bfs = self.work_start
+        histograms["cells_visited"].add(engine.cells_visited - visited)
+        histograms["objects_moved"].add(engine.objects_moved - moved)
+        histograms["bfs_nodes"].add(engine.bfs_nodes - bfs)
+        histograms["sludge_frontier"].add(engine.frontier_size())
+        self.ticks += 1
+
+    def summary(self):
+        """{metric: {"p50", "p99", "max"}} over the window."""
+        return {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+    def lines(self):
+        """Short text lines for the debug overlay."""
+        summary = self.summary()
+        lines = [f"tick {self.ticks}"]
+        for name in TIMERS:
+            s = summary[name]
+            lines.append(f"{name:<8} p50 {s['p50']:.2f}  p99 {s['p99']:.2f}  max {s['max']:.2f} ms")
+        for name in COUNTERS:
+            s = summary[name]
+            lines.append(f"{name:<15} p50 {s['p50']}  p99 {s['p99']}  max {s['max']}")
+        return lines
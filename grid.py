@@ -2,43 +2,162 @@
 Grid module for Boulderflash.
 Handles the map layout and tile rendering.
 """
-import pygame
 from constants import (
     TILE_SIZE, COLOR_DATA, COLOR_WALL, COLOR_FIREWALL, COLOR_KEY, 
     COLOR_EXIT, COLOR_PREDATOR, COLOR_BUILDER, COLOR_GRAVITY, 
     COLOR_BOMB, COLOR_TELEPORTER, COLOR_PILLAR, COLOR_SLUDGE, COLOR_EMPTY,
     DATA, WALL, FIREWALL, KEY, EXIT, PREDATOR, BUILDER, GRAVITY_ZONE, 
-    BOMB, TELEPORTER, PILLAR, SLUDGE, EMPTY
+    BOMB, TELEPORTER, PILLAR, SLUDGE, EMPTY, PLAYER
 )
 
 import os
-from utils import resource_path
+import random
+import sys
+import weakref
+from array import array
+from collections import defaultdict
+import textures
+from animation import AnimationClock
+
+# Zobrist keys: one independent 64-bit key per (cell, tile) pair, at
+# CELL_KEYS[offset << TILE_BITS | tile], packed 8 bytes each in an array.
+# The tables come from a fixed seed: hashes are the same from one run to the
+# next, which replay logs rely on.
+TILE_BITS = 4 # Types de tuile < 16
+_hash_rng = random.Random(0xB0D1F1A5)
+KEY_COUNT_KEYS = [_hash_rng.getrandbits(64) for _ in range(64)]
+CELL_KEYS = array('Q')
+KEY_BLOCK = 4096
+
+
+# Images under assets/ used by load_textures
+STATIC_ASSETS = {
+    DATA: "wall.png",       # Utilisation de wall.png pour les blocs destructibles
+    WALL: "border.png",     # border.png pour les murs indestructibles
+    FIREWALL: "rock.png",   # rock.png pour les firewall/rochers
+    KEY: "key.png"          # key.png pour les clés
+}
+TELEPORTER_SHEET = ("teleport.png", 6)
+EXIT_ASSETS = {"exit_red": ("sortie_red_{}.png", 10), "exit_green": ("sortie_green_{}.png", 10)}
+ANIMATED_ASSETS = ( # tile, frame file pattern, frames
+    (KEY, "key_{}.png", 8),
+    (FIREWALL, os.path.join("firewall", "firewall_{}.png"), 8),
+    (SLUDGE, "slime_block_{}.png", 10),     # slime_block is 80x80, scaled to TILE_SIZE
+    (PREDATOR, "virus_{}.png", 10),
+    (BUILDER, "replicator_{}.png", 8),
+    (GRAVITY_ZONE, "gravity_well_{}.png", 8),
+    (BOMB, "usb_key_{}.png", 6),            # USB Key (replacing Bomb)
+    (PILLAR, "pillar_{}.png", 8),
+    (WALL, os.path.join("hardware_wall", "hardware_wall_{}.png"), 8), # Borders
+)
+EXPLOSION_ASSETS = (os.path.join("big_explosion", "big_explosion_{}.png"), 12)
+
+
+def texture_assets():
+    """Every image file load_textures may read, e.g. to preload them."""
+    patterns = [(pattern, count) for _, pattern, count in ANIMATED_ASSETS]
+    patterns += list(EXIT_ASSETS.values()) + [("sortie_green_.png", 1), EXPLOSION_ASSETS]
+    names = list(STATIC_ASSETS.values()) + [TELEPORTER_SHEET[0]]
+    names += [pattern.format(i) for pattern, count in patterns for i in range(count)]
+    return list(dict.fromkeys(names))
+
+
+JOURNAL_LIMIT = 1 << 14 # Au-delà, le journal est vidé et tout le monde relit la carte
+
+
+def cell_keys(n):
+    """The (cell, tile) keys of at least n cells, drawn on demand in blocks of
+    KEY_BLOCK seeded by their block number, so a key never depends on the map
+    sizes seen before."""
+    while len(CELL_KEYS) < n << TILE_BITS:
+        rng = random.Random(0x5EED0000 + len(CELL_KEYS) // KEY_BLOCK)
+        block = array('Q', rng.randbytes(KEY_BLOCK * 8))
+        if sys.byteorder == "big":
+            block.byteswap() # Mêmes clés quel que soit le processeur
+        CELL_KEYS.extend(block)
+    return CELL_KEYS
+
+
+class ChangeCursor:
+    """One consumer's place in a Grid's change journal (see Grid.watch)."""
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.position = grid.journal_start + len(grid.journal)
+        self.generation = -1 # Tout relire au premier drain
+
+    def drain(self):
+        """(full, changes): the (x, y, old, new) tile changes since the last
+        drain, oldest first. full is True when they do not tell the whole
+        story (new map, journal overflow): re-read every cell instead."""
+        grid = self.grid
+        end = grid.journal_start + len(grid.journal)
+        if self.generation != grid.generation:
+            self.generation = grid.generation
+            self.position = end
+            return True, []
+        if self.position == end:
+            return False, []
+        changes = grid.journal[self.position - grid.journal_start:]
+        self.position = end
+        if len(grid.journal) > 256:
+            grid.trim_journal()
+        return False, changes
+
 
 class Grid:
+    # Check the Zobrist hash against a full recompute on every read (slow)
+    debug_hash = False
+
     def __init__(self, width, height, load_graphics=True):
         self.width = width
         self.height = height
-        self.tiles = [[DATA for _ in range(width)] for _ in range(height)]
+        # Tiles live in one flat bytearray, row after row, with a ring of WALL
+        # sentinels around the map: neighbour reads from any cell of the map
+        # never leave the buffer, so hot loops can skip bounds checks.
+        self.stride = width + 2
+        self.cells = bytearray([WALL]) * (self.stride * (height + 2))
+        for y in range(height):
+            start = self.index(0, y)
+            self.cells[start:start + width] = bytes([DATA]) * width
+        # Change journal: every effective tile change as (x, y, old, new),
+        # read by each consumer (engine, renderer...) through its own cursor.
+        # journal[0] is change number journal_start; a new generation means
+        # the map was rewritten as a whole.
+        self.journal = []
+        self.journal_start = 0
+        self.generation = 0
+        self.cursors = weakref.WeakSet()
+        # Zobrist hash of the tiles, kept by set_tile; the player (set by the
+        # engine) is folded in by the zobrist property
+        self.cell_keys = cell_keys(len(self.cells))
+        self.tile_hash = 0
+        self.player = None
         
         # Load textures
         self.textures = {}
         self.animated_textures = {}
         self.explosion_frames = []
         self.active_explosions = []
+        self.animation = AnimationClock() # Image courante de chaque animation, par draw()
         
         if load_graphics:
             self.load_textures()
         
         # Add a border of walls
         for x in range(width):
-            self.tiles[0][x] = WALL
-            self.tiles[height-1][x] = WALL
+            self.cells[self.index(x, 0)] = WALL
+            self.cells[self.index(x, height - 1)] = WALL
         for y in range(height):
-            self.tiles[y][0] = WALL
-            self.tiles[y][width-1] = WALL
+            self.cells[self.index(0, y)] = WALL
+            self.cells[self.index(width - 1, y)] = WALL
+        
+        # Live index: tile type -> set of (x, y) holding it, kept by set_tile
+        self.tile_positions = defaultdict(set)
+        self.rebuild_positions()
     
     @staticmethod
-    def from_list(cells):
+    def from_list(cells, load_graphics=True):
         """Create a Grid from a 2D list of cell values."""
         if not cells or not cells[0]:
             raise ValueError("Empty cells list")
@@ -47,250 +166,217 @@ class Grid:
         width = len(cells[0])
         
         # Use standard instantiation instead of __new__ hack
-        # Auto-load graphics
-        grid = Grid(width, height, load_graphics=True)
+        grid = Grid(width, height, load_graphics=load_graphics)
         
         # Override tiles with provided data
-        grid.tiles = [row[:] for row in cells]  # Deep copy
+        grid.tiles = cells
         
         return grid
 
+    @staticmethod
+    def from_bytes(width, height, tiles, load_graphics=True):
+        """Create a Grid from width*height tile bytes, row by row (level_cache)."""
+        grid = Grid(width, height, load_graphics=load_graphics)
+        for y in range(height):
+            start = grid.index(0, y)
+            grid.cells[start:start + width] = tiles[y * width:(y + 1) * width]
+        grid.rebuild_positions()
+        grid.invalidate_all()
+        return grid
+
+    def index(self, x, y):
+        """Offset of (x, y) in the flat cells buffer."""
+        return (y + 1) * self.stride + x + 1
+
+    @property
+    def tiles(self):
+        """Copy of the map as a list of rows (``tiles[y][x]``)."""
+        return [list(self.row(y)) for y in range(self.height)]
+
+    @tiles.setter
+    def tiles(self, rows):
+        if len(rows) != self.height or any(len(row) != self.width for row in rows):
+            raise ValueError("Rows must match the grid size")
+        for y, row in enumerate(rows):
+            start = self.index(0, y)
+            self.cells[start:start + self.width] = bytes(row)
+        self.rebuild_positions()
+        self.invalidate_all()
+
+    def watch(self):
+        """A ChangeCursor over this grid's tile changes, starting with a full read."""
+        cursor = ChangeCursor(self)
+        self.cursors.add(cursor)
+        return cursor
+
+    def invalidate_all(self):
+        """Raise the full-invalidate marker: every cursor re-reads the map."""
+        self.journal_start += len(self.journal)
+        self.journal = []
+        self.generation += 1
+
+    def trim_journal(self):
+        """Drop the changes every live cursor has read."""
+        end = self.journal_start + len(self.journal)
+        low = min((cursor.position for cursor in self.cursors if cursor.generation == self.generation),
+                  default=end)
+        del self.journal[:low - self.journal_start]
+        self.journal_start = low
+
+    def rebuild_positions(self):
+        """Recompute the tile type -> positions index and the tile hash from the cells."""
+        self.tile_positions.clear()
+        for y in range(self.height):
+            for x, tile in enumerate(self.row(y)):
+                self.tile_positions[tile].add((x, y))
+        self.tile_hash = self.compute_tile_hash()
+
+    def compute_tile_hash(self):
+        """Zobrist hash of the tiles from scratch, O(W*H)."""
+        keys = self.cell_keys
+        h = 0
+        for i, tile in enumerate(self.cells):
+            h ^= keys[i << TILE_BITS | tile]
+        return h
+
+    def compute_zobrist(self):
+        """The zobrist property, recomputed from scratch."""
+        return self.compute_tile_hash() ^ self.player_hash()
+
+    def player_hash(self):
+        player = self.player
+        if player is None:
+            return 0
+        i = (player.y + 1) * self.stride + player.x + 1
+        return self.cell_keys[i << TILE_BITS | PLAYER] ^ KEY_COUNT_KEYS[player.keys & 63]
+
+    @property
+    def zobrist(self):
+        """64-bit hash of the tiles, the player's square and collected keys, O(1)."""
+        h = self.tile_hash ^ self.player_hash()
+        if self.debug_hash and h != self.compute_zobrist():
+            raise RuntimeError("Zobrist hash out of sync with the cells")
+        return h
+
+    def positions(self, tile_type):
+        """Set of (x, y) currently holding tile_type. Do not modify it."""
+        return self.tile_positions[tile_type]
+
+    def count(self, tile_type):
+        return len(self.tile_positions[tile_type])
+
+    def row(self, y):
+        """Read-only live view of row y."""
+        start = self.index(0, y)
+        return memoryview(self.cells)[start:start + self.width].toreadonly()
+
+    def column(self, x):
+        """Read-only live view of column x, top to bottom."""
+        start = self.index(x, 0)
+        end = self.index(x, self.height - 1) + 1
+        return memoryview(self.cells)[start:end:self.stride].toreadonly()
+
     def load_textures(self):
-        asset_map = {
-            DATA: "wall.png",       # Utilisation de wall.png pour les blocs destructibles
-            WALL: "border.png",     # border.png pour les murs indestructibles
-            FIREWALL: "rock.png",   # rock.png pour les firewall/rochers
-            KEY: "key.png"          # key.png pour les clés
-        }
-        for tile_type, filename in asset_map.items():
-            path = resource_path(os.path.join("assets", filename))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    self.textures[tile_type] = pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE))
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
+        # Les images viennent du cache partagé (textures.py) : lues une seule
+        # fois par processus, quel que soit le nombre de grilles
+        size = (TILE_SIZE, TILE_SIZE)
+        for tile_type, filename in STATIC_ASSETS.items():
+            texture = textures.get(filename, size)
+            if texture is not None:
+                self.textures[tile_type] = texture
+        
+        # Animated Teleporter: 445x70 / 6 frames ~= 74 pixels par frame
+        teleporter_frames = textures.sheet(*TELEPORTER_SHEET, size)
+        if teleporter_frames:
+            self.animated_textures[TELEPORTER] = teleporter_frames
         
-        # Load Animated Teleporter
-        tele_path = resource_path(os.path.join("assets", "teleport.png"))
-        if os.path.exists(tele_path):
-            try:
-                sheet = pygame.image.load(tele_path).convert_alpha()
-                # 445x70 / 6 frames ~= 74 pixels par frame
-                frame_w = sheet.get_width() // 6
-                frame_h = sheet.get_height()
-                frames = []
-                for i in range(6):
-                    rect = pygame.Rect(i * frame_w, 0, frame_w, frame_h)
-                    frame = sheet.subsurface(rect)
-                    frames.append(pygame.transform.scale(frame, (TILE_SIZE, TILE_SIZE)))
-                self.animated_textures[TELEPORTER] = frames
-            except Exception as e:
-                print(f"Error loading teleport spritesheet: {e}")
+        # Exits are always present, even without frames
+        for name, (pattern, count) in EXIT_ASSETS.items():
+            self.animated_textures[name] = textures.frames(pattern, count, size)
+        # sortie_green_.png if it exists (potential missing frame)
+        self.animated_textures["exit_green"] += textures.frames("sortie_green_.png", 1, size)
         
-        # Load Animated Key
-        key_frames = []
-        for i in range(8):
-            path = resource_path(os.path.join("assets", f"key_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    key_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading key frame {i}: {e}")
-        if key_frames:
-            self.animated_textures[KEY] = key_frames
-
-        # Load Animated Exit Red (sortie_red_0.png to sortie_red_6.png)
-        exit_red_frames = []
-        for i in range(10): # Check up to 10
-            path = resource_path(os.path.join("assets", f"sortie_red_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    exit_red_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading exit_red frame {i}: {e}")
-        self.animated_textures["exit_red"] = exit_red_frames
-
-        # Load Animated Exit Green (sortie_green_0.png to sortie_green_5.png)
-        exit_green_frames = []
-        for i in range(10):
-            path = resource_path(os.path.join("assets", f"sortie_green_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    exit_green_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading exit_green frame {i}: {e}")
-        # Add sortie_green_.png if it exists (potential missing frame)
-        extra_path = resource_path(os.path.join("assets", "sortie_green_.png"))
-        if os.path.exists(extra_path):
-            try:
-                img = pygame.image.load(extra_path).convert_alpha()
-                exit_green_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-            except: pass
-        self.animated_textures["exit_green"] = exit_green_frames
-
-        # Load Animated Firewalls (firewall_0.png to firewall_7.png in assets/firewall/)
-        firewall_frames = []
-        for i in range(8):
-            path = resource_path(os.path.join("assets", "firewall", f"firewall_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    firewall_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading firewall frame {i}: {e}")
-        if firewall_frames:
-            self.animated_textures[FIREWALL] = firewall_frames
-
-        # Load Animated Sludge / Corruption (slime_block_0.png to slime_block_7.png)
-        slime_frames = []
-        for i in range(10): # Check up to 10
-            path = resource_path(os.path.join("assets", f"slime_block_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    # slime_block is 80x80 according to decoupeur, we scale to TILE_SIZE
-                    slime_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading slime_block frame {i}: {e}")
-        if slime_frames:
-            self.animated_textures[SLUDGE] = slime_frames
-
-        # Load Animated Virus (enemy) (antivirus_0.png to antivirus_7.png)
-        virus_frames = []
-        for i in range(10): 
-            path = resource_path(os.path.join("assets", f"virus_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    virus_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading virus frame {i}: {e}")
-        if virus_frames:
-            self.animated_textures[PREDATOR] = virus_frames
-
-        # Load Animated Replicator/Builder (replicator_0.png to replicator_7.png)
-        replicator_frames = []
-        for i in range(8):  # 8 frames for replicator
-            path = resource_path(os.path.join("assets", f"replicator_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    replicator_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading replicator frame {i}: {e}")
-        if replicator_frames:
-            self.animated_textures[BUILDER] = replicator_frames
-
-        # Load Animated Gravity Well (gravity_well_0.png to gravity_well_7.png)
-        gravity_well_frames = []
-        for i in range(8):  # 8 frames for gravity well
-            path = resource_path(os.path.join("assets", f"gravity_well_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    gravity_well_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading gravity_well frame {i}: {e}")
-        if gravity_well_frames:
-            self.animated_textures[GRAVITY_ZONE] = gravity_well_frames
-
-        # Load Animated USB Key (replacing Bomb)
-        usb_frames = []
-        for i in range(6): 
-            path = resource_path(os.path.join("assets", f"usb_key_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    usb_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading usb_key frame {i}: {e}")
-        if usb_frames:
-            self.animated_textures[BOMB] = usb_frames
-
-        # Load Animated Pillar (pillar_0.png to pillar_7.png)
-        pillar_frames = []
-        for i in range(8):
-            path = resource_path(os.path.join("assets", f"pillar_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    pillar_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading pillar frame {i}: {e}")
-        if pillar_frames:
-            self.animated_textures[PILLAR] = pillar_frames
-
-        # Load Animated Hardware Wall for Borders (hardware_wall_0.png to 7.png in assets/hardware_wall/)
-        hardware_wall_frames = []
-        for i in range(8):
-            path = resource_path(os.path.join("assets", "hardware_wall", f"hardware_wall_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    hardware_wall_frames.append(pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE)))
-                except Exception as e:
-                    print(f"Error loading hardware_wall frame {i}: {e}")
-        if hardware_wall_frames:
-            self.animated_textures[WALL] = hardware_wall_frames
-
-        # Load Big Explosion (3x3 effect)
-        for i in range(12):
-            path = resource_path(os.path.join("assets", "big_explosion", f"big_explosion_{i}.png"))
-            if os.path.exists(path):
-                try:
-                    img = pygame.image.load(path).convert_alpha()
-                    # Scale to 3x3 tiles
-                    self.explosion_frames.append(pygame.transform.scale(img, (TILE_SIZE*3, TILE_SIZE*3)))
-                except Exception as e:
-                    print(f"Error loading explosion frame {i}: {e}")
+        for tile_type, pattern, count in ANIMATED_ASSETS:
+            frames = textures.frames(pattern, count, size)
+            if frames:
+                self.animated_textures[tile_type] = frames
+        
+        # Big Explosion (3x3 effect)
+        self.explosion_frames = textures.frames(*EXPLOSION_ASSETS, (TILE_SIZE * 3, TILE_SIZE * 3))
 
     def get_tile(self, x, y):
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.tiles[y][x]
+            return self.cells[(y + 1) * self.stride + x + 1]
         return WALL
 
     def set_tile(self, x, y, tile_type):
         if 0 <= x < self.width and 0 <= y < self.height:
-            self.tiles[y][x] = tile_type
+            i = (y + 1) * self.stride + x + 1
+            old = self.cells[i]
+            if old != tile_type:
+                self.cells[i] = tile_type
+                base = i << TILE_BITS
+                self.tile_hash ^= self.cell_keys[base | old] ^ self.cell_keys[base | tile_type]
+                self.tile_positions[old].discard((x, y))
+                self.tile_positions[tile_type].add((x, y))
+                self.journal.append((x, y, old, tile_type))
+                if len(self.journal) > JOURNAL_LIMIT:
+                    self.invalidate_all()
+
+    def set_cells(self, offsets, tiles):
+        """set_tile for many cells at once, by offset in the cells buffer."""
+        cells = self.cells
+        stride = self.stride
+        positions = self.tile_positions
+        keys = self.cell_keys
+        journal = self.journal
+        h = self.tile_hash
+        for i, tile_type in zip(offsets, tiles):
+            old = cells[i]
+            if old != tile_type:
+                cells[i] = tile_type
+                x, y = pos = (i % stride - 1, i // stride - 1)
+                positions[old].discard(pos)
+                positions[tile_type].add(pos)
+                base = i << TILE_BITS
+                h ^= keys[base | old] ^ keys[base | tile_type]
+                journal.append((x, y, old, tile_type))
+        self.tile_hash = h
+        if len(journal) > JOURNAL_LIMIT:
+            self.invalidate_all()
 
-    def add_explosion(self, bx, by):
+    def add_explosion(self, bx, by, start_time=None):
+        if start_time is None:
+            import pygame
+            start_time = pygame.time.get_ticks()
         self.active_explosions.append({
             "pos": (bx, by),
-            "start_time": pygame.time.get_ticks()
+            "start_time": start_time
         })
 
     def draw(self, surface, keys_unlocked=False, offset=(0, 0)):
+        import pygame
+        animation = self.animation
+        animation.tick(pygame.time.get_ticks()) # Une fois par image, pas par case
         for y in range(self.height):
+            row = self.row(y)
             for x in range(self.width):
                 rect = pygame.Rect(x * TILE_SIZE + offset[0], y * TILE_SIZE + offset[1], TILE_SIZE, TILE_SIZE)
-                tile = self.tiles[y][x]
+                tile = row[x]
                 
                 # Special case for EXIT: choose animation based on keys_unlocked
                 if tile == EXIT:
                     anim_key = "exit_green" if keys_unlocked else "exit_red"
                     if anim_key in self.animated_textures and self.animated_textures[anim_key]:
                         frames = self.animated_textures[anim_key]
-                        frame_idx = (pygame.time.get_ticks() // 100) % len(frames)
-                        surface.blit(frames[frame_idx], rect)
+                        surface.blit(frames[animation.frame(anim_key, len(frames))], rect)
                         continue
 
                 # Try drawing animated texture first
                 if tile in self.animated_textures:
                     frames = self.animated_textures[tile]
-                    # Animation speeds:
-                    # Virus (enemy) and Sludge are faster (70ms)
-                    # USB Key (Bomb) has a'sparkle' effect (~80ms = 12.5 FPS)
-                    # Others like Teleport/Key are standard (100ms)
-                    if tile in [PREDATOR, SLUDGE]: speed = 70
-                    elif tile == BOMB: speed = 80
-                    else: speed = 100
-                    
-                    frame_idx = (pygame.time.get_ticks() // speed) % len(frames)
-                    surface.blit(frames[frame_idx], rect)
+                    # Vitesse selon le type (animation.frame_speed) : 70, 80 ou 100 ms
+                    surface.blit(frames[animation.frame(tile, len(frames))], rect)
                     continue
 
                 # Try drawing static texture
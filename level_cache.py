@@ -0,0 +1,187 @@
+"""
+Compiled level cache for Boulderflash.
+Each level string is compiled once into a compact binary record: tile
+bytes, spawn, key count, gravity wells and teleporter pairs. The records
+are saved as a level pack (levelpack.py) keyed by the sha256 of levels.py,
+so they are rebuilt by themselves when the levels change; loading a level
+is then a buffer copy with no parsing.
+
+    python level_cache.py   # (re)build the cache, e.g. at build time
+"""
+import hashlib
+import os
+import struct
+import sys
+
+from constants import TILE_CHARS, EMPTY, KEY, GRAVITY_ZONE, TELEPORTER
+from utils import resource_path
+
+LEVEL_HEADER = struct.Struct("<7H")     # width, height, spawn x, spawn y, keys, gravity wells, teleporters
+POSITION = struct.Struct("<2H")
+PORTAL = struct.Struct("<4H")           # portail, arrivée
+# Tile -> level character, for map_string ('.' for EMPTY, not 'P')
+TILE_TO_CHAR = bytes(ord({tile: char for char, tile in TILE_CHARS.items() if char != 'P'}.get(t, '.'))
+                     for t in range(256))
+
+
+def get_cache_path():
+    """Where the compiled levels are kept (same place as the scores)."""
+    try:
+        # Android: Use app's private storage
+        from android.storage import app_storage_path
+        return os.path.join(app_storage_path(), "levels.cache")
+    except ImportError:
+        # Desktop/other: Use current directory
+        return "levels.cache"
+
+
+class CompiledLevel:
+    """One level ready to copy into a Grid: tiles are width*height bytes, row by row."""
+    __slots__ = ("width", "height", "tiles", "spawn", "keys", "gravity_zones", "teleporters")
+
+    def __init__(self, width, height, tiles, spawn, keys, gravity_zones, teleporters):
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        self.spawn = spawn
+        self.keys = keys
+        self.gravity_zones = gravity_zones
+        self.teleporters = teleporters # portail -> portail d'arrivée
+
+
+def compile_level(map_str):
+    """Level string -> CompiledLevel. Unknown characters become EMPTY."""
+    lines = map_str.strip().split('\n')
+    width = len(lines[0]) if lines else 0
+    tiles = bytearray()
+    spawn = (1, 1)
+    for y, line in enumerate(lines):
+        if 'P' in line:
+            spawn = (line.index('P'), y)
+        row = bytes(TILE_CHARS.get(char, EMPTY) for char in line[:width])
+        tiles += row + bytes([EMPTY]) * (width - len(row))
+    gravity_zones = [(i % width, i // width) for i, tile in enumerate(tiles) if tile == GRAVITY_ZONE]
+    portals = [(i % width, i // width) for i, tile in enumerate(tiles) if tile == TELEPORTER]
+    return CompiledLevel(width, len(lines), bytes(tiles), spawn, tiles.count(KEY), gravity_zones,
+                         pair_teleporters(portals))
+
+
+def pair_teleporters(portals):
+    """Portal -> arrival: the first other portal in reading order. portals
+    are (x, y) in reading order."""
+    if len(portals) < 2:
+        return {}
+    return {p: next(q for q in portals if q != p) for p in portals}
+
+
+def pack_level(level):
+    parts = [LEVEL_HEADER.pack(level.width, level.height, *level.spawn, level.keys,
+                               len(level.gravity_zones), len(level.teleporters))]
+    parts.extend(POSITION.pack(*zone) for zone in level.gravity_zones)
+    parts.extend(PORTAL.pack(*portal, *target) for portal, target in level.teleporters.items())
+    parts.append(level.tiles)
+    return b"".join(parts)
+
+
+def unpack_level(data, offset=0):
+    """Returns (CompiledLevel, offset after it)."""
+    width, height, x, y, keys, n_zones, n_portals = LEVEL_HEADER.unpack_from(data, offset)
+    offset += LEVEL_HEADER.size
+    zones = [POSITION.unpack_from(data, offset + i * POSITION.size) for i in range(n_zones)]
+    offset += n_zones * POSITION.size
+    teleporters = {}
+    for _ in range(n_portals):
+        px, py, tx, ty = PORTAL.unpack_from(data, offset)
+        teleporters[(px, py)] = (tx, ty)
+        offset += PORTAL.size
+    tiles = bytes(data[offset:offset + width * height])
+    level = CompiledLevel(width, height, tiles, (x, y), keys, zones, teleporters)
+    return level, offset + width * height
+
+
+def levels_digest(levels=None):
+    """sha256 of levels.py; of the level strings when only the bytecode
+    ships, or None if they were not given."""
+    path = resource_path("levels.py")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).digest()
+    if levels is None:
+        return None
+    return hashlib.sha256("\0".join(levels).encode()).digest()
+
+
+def open_pack(path, digest):
+    """The LevelPack at path if it holds these levels (any levels when
+    digest is None), else None."""
+    from levelpack import LevelPack
+    try:
+        pack = LevelPack(path)
+    except (OSError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Error loading level pack: {e}")
+        return None
+    if digest is not None and pack.digest != digest:
+        pack.close()
+        return None
+    return pack
+
+
+def build_cache(levels, digest, path):
+    from levelpack import write_pack
+    compiled = [compile_level(map_str) for map_str in levels]
+    try:
+        write_pack(compiled, path, digest)
+    except OSError as e:
+        print(f"Error saving level cache: {e}")
+        return compiled
+    return open_pack(path, digest) or compiled
+
+
+_levels = None
+
+
+def load_levels(path=None):
+    """Every level of levels.LEVELS compiled, as a lazily decoded LevelPack:
+    the one shipped with the game, else the cache file, rebuilt if stale."""
+    global _levels
+    if _levels is None:
+        from levelpack import DEFAULT_PACK
+        digest = levels_digest()
+        _levels = open_pack(resource_path(DEFAULT_PACK), digest)
+        if _levels is None:
+            # Pas de pack à jour livré avec le jeu : seulement ici on importe levels.py
+            from levels import LEVELS
+            digest = digest or levels_digest(LEVELS)
+            path = path or get_cache_path()
+            _levels = open_pack(path, digest) or build_cache(LEVELS, digest, path)
+    return _levels
+
+
+def get_level(index):
+    return load_levels()[index]
+
+
+def level_count():
+    return len(load_levels())
+
+
+def map_string(level):
+    """The level as a levels.py string, e.g. for replay logs."""
+    rows = [bytearray(level.tiles[y * level.width:(y + 1) * level.width]).translate(TILE_TO_CHAR)
+            for y in range(level.height)]
+    x, y = level.spawn
+    rows[y][x] = ord('P')
+    return "\n".join(row.decode() for row in rows)
+
+
+def main():
+    from levels import LEVELS
+    path = get_cache_path()
+    compiled = build_cache(LEVELS, levels_digest(LEVELS), path)
+    print(f"{len(compiled)} levels compiled to {path} ({os.path.getsize(path)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
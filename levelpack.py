@@ -0,0 +1,125 @@
+"""
+Level packs for Boulderflash.
+A pack is one file: a header, an index of (offset, size) per level, then
+the levels compiled by level_cache. It is read through mmap and a level is
+only decoded when asked for, keeping the last two (current and next), so
+opening a pack of thousands of levels costs the same as one of ten.
+
+    python levelpack.py build                          # levels.py -> levels.bfpack, if every level is valid
+    python levelpack.py build my_levels.txt my.bfpack  # a user pack
+    python levelpack.py info my.bfpack
+"""
+import argparse
+import mmap
+import struct
+import sys
+from collections import OrderedDict
+
+from level_cache import compile_level, pack_level, unpack_level
+
+PACK_VERSION = 1
+MAGIC = b"BFPK"
+PACK_HEADER = struct.Struct("<4sH32sI") # magic, version, sha256 of the source (or zeros), levels
+INDEX_ENTRY = struct.Struct("<2I")      # offset, size
+PACK_EXT = ".bfpack"
+DEFAULT_PACK = "levels" + PACK_EXT
+
+
+class LevelPack:
+    """Read-only sequence of CompiledLevel backed by a mmapped pack file."""
+
+    def __init__(self, path, keep=2):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.digest, self.count = PACK_HEADER.unpack_from(self.data)
+        except struct.error:
+            self.close()
+            raise ValueError(f"{path} is not a level pack")
+        if magic != MAGIC or version != PACK_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a level pack (version {PACK_VERSION})")
+        self.keep = keep
+        self.decoded = OrderedDict() # index -> CompiledLevel, les plus récents en dernier
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("level index out of range")
+        level = self.decoded.get(index)
+        if level is None:
+            offset, size = INDEX_ENTRY.unpack_from(self.data, PACK_HEADER.size + index * INDEX_ENTRY.size)
+            level, end = unpack_level(self.data, offset)
+            if end != offset + size:
+                raise ValueError(f"{self.path}: level {index} is damaged")
+            self.decoded[index] = level
+            if len(self.decoded) > self.keep:
+                self.decoded.popitem(last=False)
+        else:
+            self.decoded.move_to_end(index)
+        return level
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        self.data.close()
+
+
+def write_pack(levels, path, digest=bytes(32)):
+    """Write compiled levels (or level strings) as a pack."""
+    records = [pack_level(compile_level(level) if isinstance(level, str) else level) for level in levels]
+    offset = PACK_HEADER.size + len(records) * INDEX_ENTRY.size
+    index = []
+    for record in records:
+        index.append(INDEX_ENTRY.pack(offset, len(record)))
+        offset += len(record)
+    with open(path, "wb") as f:
+        f.write(PACK_HEADER.pack(MAGIC, PACK_VERSION, digest, len(records)))
+        f.write(b"".join(index))
+        f.write(b"".join(records))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect level packs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="check levels and compile them into a pack")
+    build.add_argument("source", nargs="?", help="levels.py (default) or a text file with levels separated by blank lines")
+    build.add_argument("output", nargs="?", default=DEFAULT_PACK)
+    info = commands.add_parser("info", help="describe a pack")
+    info.add_argument("pack")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        from level_cache import levels_digest
+        from validate_levels import load_levels, validate_all
+        levels = load_levels(args.source)
+        # Même contrôle que validate_levels.py : un niveau cassé ne part pas dans un pack
+        invalid = [report for report in validate_all(levels) if report["errors"]]
+        for report in invalid:
+            for problem in report["errors"]:
+                print(f"level {report['level'] + 1}: ERROR {problem}", file=sys.stderr)
+        if invalid:
+            print(f"{len(invalid)} invalid levels, {args.output} not written", file=sys.stderr)
+            return 1
+        # Le pack du jeu porte le hash de levels.py, comme le cache
+        digest = levels_digest(levels) if args.source in (None, "levels.py") else bytes(32)
+        write_pack(levels, args.output, digest)
+        print(f"{len(levels)} levels packed into {args.output}")
+    else:
+        pack = LevelPack(args.pack)
+        sizes = [(level.width, level.height) for level in pack]
+        print(f"{args.pack}: {len(pack)} levels, "
+              f"largest {max(sizes, key=lambda s: s[0] * s[1], default=(0, 0))}")
+        pack.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -30,24 +30,41 @@ class PygameShim:
             def __init__(self, *args, **kwargs): pass
             def render(self, *args, **kwargs): return None
     class Surface:
-        def __init__(self, texture=None, size=(0,0)):
-            self.texture = texture
-            self.width, self.height = size if texture is None else texture.size
-        def convert_alpha(self): return self
-        def convert(self): return self
+        def __init__(self, texture=None, size=(0,0), image=None):
+            self._texture = texture
+            self._image = image # Decoded but not uploaded yet (see image.load)
+            if image is not None:
+                self.width, self.height = image.width, image.height
+            else:
+                self.width, self.height = size if texture is None else texture.size
+        @property
+        def texture(self):
+            # GL upload on first use: main thread only
+            if self._texture is None and self._image is not None:
+                self._texture = self._image.texture
+                self._image = None
+            return self._texture
+        def convert_alpha(self):
+            self.texture
+            return self
+        def convert(self): return self.convert_alpha()
         def get_width(self): return self.width
         def get_height(self): return self.height
-        def subsurface(self, rect): return self # Todo if needed
+        def subsurface(self, rect):
+            # Kivy regions count y from the bottom
+            texture = self.texture
+            if texture is None:
+                return self
+            return PygameShim.Surface(texture.get_region(rect.x, self.height - rect.y - rect.h, rect.w, rect.h))
         
     class image:
         @staticmethod
         def load(path):
-            from kivy.core.image import Image as CoreImage
+            # Decode only, like kivy.loader does on its threads: the texture
+            # is created by convert_alpha() or the first .texture access
+            from kivy.core.image import ImageLoader
             try:
-                # remove ./ if present as it might confuse Kivy loader sometimes?
-                # actually CoreImage handles paths fairly well.
-                img = CoreImage(path)
-                return PygameShim.Surface(img.texture)
+                return PygameShim.Surface(image=ImageLoader.load(path))
             except Exception as e:
                 print(f"Shim: Failed to load {path}: {e}")
                 return PygameShim.Surface()
@@ -66,29 +83,28 @@ class PygameShim:
 
 
 sys.modules['pygame'] = PygameShim
-import pygame
 
 # Kivy imports
 from kivy.app import App
 from kivy.uix.widget import Widget
 from kivy.clock import Clock
-from kivy.graphics import Color, Rectangle, Ellipse, Line, PushMatrix, PopMatrix, Scale, Translate
+from kivy.graphics import Canvas, Color, Rectangle, Ellipse, Line, PushMatrix, PopMatrix, Scale, Translate
 from kivy.core.window import Window
 from kivy.core.text import Label as CoreLabel
 
 # Game imports
 from constants import (
     SCREEN_WIDTH, SCREEN_HEIGHT, HUD_WIDTH, TILE_SIZE, FPS,
-    COLOR_BG, COLOR_HACKER, COLOR_DATA, COLOR_WALL, COLOR_FIREWALL,
-    COLOR_EMPTY, COLOR_KEY, COLOR_EXIT, COLOR_PREDATOR, COLOR_BUILDER,
-    COLOR_GRAVITY, COLOR_BOMB, COLOR_TELEPORTER, COLOR_PILLAR, COLOR_SLUDGE,
-    EMPTY, DATA, WALL, FIREWALL, KEY, EXIT, PLAYER, PREDATOR, BUILDER,
-    GRAVITY_ZONE, BOMB, TELEPORTER, PILLAR, SLUDGE
+    COLOR_BG, COLOR_HACKER
 )
-from grid import Grid
+from grid import Grid, texture_assets
 from engine import Engine
-from levels import LEVELS
+from engine_stats import EngineStats
+import level_cache
+import textures
 import scores
+from replay import Recorder
+from tile_layer import TileLayer
 
 # Detect Android
 IS_ANDROID = "ANDROID_ARGUMENT" in os.environ or "ANDROID_ENTRYPOINT" in os.environ
@@ -101,8 +117,11 @@ class GameWidget(Widget):
         super().__init__(**kwargs)
         
         # Initialize game state (same as pygame version)
-        self.grid = Grid(1, 1)
+        self.grid = Grid(1, 1, load_graphics=False)
         self.engine = Engine(self.grid)
+        # Images decode on worker threads while the legend is up
+        textures.use_atlas() # When texture_atlas.py has built one
+        self.preloader = textures.Preloader(textures.atlas_pages() or texture_assets())
         self.player_x = 0
         self.player_y = 0
         self.keys_collected = 0
@@ -120,6 +139,7 @@ class GameWidget(Widget):
         self.high_scores = scores.get_top_scores(online=self.viewing_online)
         self.crush_time = 0
         self.showing_quit_confirm = False
+        self.stats = None # EngineStats while the debug overlay is on (F3)
         
         # Animation state
         self.anim_state = "idle"
@@ -150,10 +170,31 @@ class GameWidget(Widget):
             "pillar": (SCREEN_WIDTH - HUD_WIDTH - 90, 180, 80, 80),
         }
         
+        # Canvas layout: the tile layer keeps its instructions from one frame
+        # to the next; only the small canvases around it are redrawn
+        self.backdrop_canvas = Canvas()
+        self.game_translate = Translate(0, 0)
+        self.game_zoom = Scale(1, 1, 1)
+        self.tile_layer = TileLayer()
+        self.overlay_canvas = Canvas()
+        self.hud_canvas = Canvas()
+        self.canvas.add(self.backdrop_canvas)
+        self.canvas.add(PushMatrix())
+        self.canvas.add(self.game_translate)
+        self.canvas.add(self.game_zoom)
+        self.canvas.add(Color(*COLOR_BG))
+        self.canvas.add(Rectangle(pos=(0, 0), size=(SCREEN_WIDTH, SCREEN_HEIGHT)))
+        self.canvas.add(self.tile_layer.group)
+        self.canvas.add(self.overlay_canvas)
+        self.canvas.add(PopMatrix())
+        self.canvas.add(self.hud_canvas)
+        
         # Keyboard state
         self.keys_pressed = set()
         Window.bind(on_key_down=self.on_key_down)
         Window.bind(on_key_up=self.on_key_up)
+        # Low memory (Android): drop the cached textures, reloaded on demand
+        Window.bind(on_memorywarning=textures.on_low_memory)
         
         # Schedule game update loop
         Clock.schedule_interval(self.update, 1.0 / FPS)
@@ -178,119 +219,120 @@ class GameWidget(Widget):
     
     def load_level(self, index):
         """Load a level from the levels list."""
-        if index >= len(LEVELS):
+        if index >= level_cache.level_count():
             return
 
-        map_str = LEVELS[index].strip()
-        lines = map_str.split('\n')
-        height = len(lines)
-        width = len(lines[0]) if lines else 0
-        
-        # Create 2D grid
-        cells = []
-        player_pos = (1, 1)
-        keys_count = 0
-        
-        for y, line in enumerate(lines):
-            row = []
-            for x, char in enumerate(line):
-                if char == '#': row.append(WALL)
-                elif char == '*': row.append(DATA)
-                elif char == 'F': row.append(FIREWALL)
-                elif char == 'K': 
-                    row.append(KEY)
-                    keys_count += 1
-                elif char == 'P':
-                    player_pos = (x, y)
-                    row.append(EMPTY)
-                elif char == 'A': row.append(PREDATOR)
-                elif char == 'B': row.append(BUILDER)
-                elif char == 'G':
-                    row.append(GRAVITY_ZONE)
-                elif char == 'X': row.append(EXIT)
-                elif char == 'T': row.append(TELEPORTER)
-                elif char == 'S': row.append(SLUDGE)
-                elif char == '.': row.append(EMPTY)
-                else: row.append(EMPTY)
-            cells.append(row)
-        
-        # Create grid from cells
-        self.grid = Grid.from_list(cells)
+        # Niveau précompilé (level_cache) : une copie de tampon, sans parsing
+        level = level_cache.get_level(index)
+        map_str = level_cache.map_string(level) # For the session log
+        self.grid = Grid.from_bytes(level.width, level.height, level.tiles,
+                                    load_graphics=self.preloader is None)
         self.engine = Engine(self.grid)
-        self.player_x, self.player_y = player_pos
-        self.required_keys = max(1, keys_count)
-        self.keys_collected = 0
-        self.bombs_count = 5
-        self.pillars_count = 3
-        self.game_over = False
-        self.won = False
+        self.engine.stats = self.stats
         
         # Register gravity zones in engine
         self.engine.gravity_zones.clear()
-        for y in range(height):
-            for x in range(len(cells[y]) if y < len(cells) else 0):
-                if cells[y][x] == GRAVITY_ZONE:
-                    self.engine.gravity_zones.add((x, y))
+        self.engine.gravity_zones.update(level.gravity_zones)
+        self.engine.teleporters = level.teleporters
+        self.engine.load_enemies()
+        # The engine owns the player and the movement rules, like replay.py
+        self.engine.spawn_player(*level.spawn)
+        self.sync_player()
+        self.game_over = False
+        self.won = False
+        # Level start, restored on death instead of re-parsing the level and
+        # reloading the textures
+        self.level_start = (index, map_str, self.engine.snapshot())
+        # Session log, saved on death, win or exit (replay.py)
+        self.recorder = Recorder(self.engine, map_str, level=index)
+    
+    def restart_level(self):
+        """Back to the start of the current level from the cached snapshot."""
+        index, map_str, start = self.level_start
+        if index != self.current_level_index:
+            self.load_level(self.current_level_index)
+            return
+        self.engine.restore(start)
+        self.sync_player()
+        self.game_over = False
+        self.won = False
+        self.recorder = Recorder(self.engine, map_str, level=index)
+    
+    def sync_player(self):
+        """Copy the engine's player into the widget's HUD and drawing state."""
+        player = self.engine.player
+        self.player_x, self.player_y = player.x, player.y
+        self.keys_collected = player.keys
+        self.required_keys = player.required_keys
+        self.bombs_count = player.bombs
+        self.pillars_count = player.pillars
+    
+    def save_session(self):
+        try:
+            self.recorder.save()
+        except Exception as e:
+            print(f"Error saving session: {e}")
+    
+    def finish_preload(self):
+        """Upload whatever the preloader has left and give the grid its textures."""
+        self.preloader.finish()
+        self.preloader = None
+        self.grid.load_textures()
+        self.tile_layer.refresh()
     
     def handle_death(self):
         """Trigger death animation and state."""
+        self.save_session()
         self.lives -= 1
         if self.lives <= 0:
             self.game_over = True
         else:
-            # Reload current level
-            self.load_level(self.current_level_index)
+            # Restart current level
+            self.restart_level()
     
     def move_player(self, dx, dy):
         """Move player if possible."""
         if self.game_over or self.won or self.showing_legend:
             return
         
-        new_x = self.player_x + dx
-        new_y = self.player_y + dy
-        
-        # Check bounds
-        if not (0 <= new_x < self.grid.width and 0 <= new_y < self.grid.height):
-            return
-        
-        target_cell = self.grid.get_tile(new_x, new_y)
+        # Movement rules live in the engine (same as replays)
+        outcome = self.engine.move_player(dx, dy)
+        self.sync_player()
         
-        # Handle collisions
-        if target_cell == WALL or target_cell == FIREWALL:
-            return
-            
-        if target_cell == EXIT:
-            if self.keys_collected >= self.required_keys:
-                print("Level Complete!")
-                self.current_level_index += 1
-                if self.current_level_index < len(LEVELS):
-                    self.load_level(self.current_level_index)
-                else:
-                    print("Game Won!")
-                    self.won = True
-                return
+        if outcome == "won":
+            self.save_session()
+            print("Level Complete!")
+            self.current_level_index += 1
+            if self.current_level_index < level_cache.level_count():
+                self.load_level(self.current_level_index)
             else:
-                # Locked exit acts as a wall
-                return
-
-        elif target_cell == KEY:
-            self.keys_collected += 1
-            self.grid.set_tile(new_x, new_y, EMPTY)
-        elif target_cell == EXIT:
-            if self.keys_collected >= self.required_keys:
+                print("Game Won!")
                 self.won = True
-                return
-            else:
-                return  # Can't exit without all keys
-        
-        # Move player
-        self.player_x = new_x
-        self.player_y = new_y
+        elif outcome == "dead":
+            self.handle_death()
+    
+    def place_bomb(self):
+        if self.game_over or self.won or self.showing_legend:
+            return
+        self.engine.place_bomb()
+        self.sync_player()
+    
+    def place_pillar(self):
+        if self.game_over or self.won or self.showing_legend:
+            return
+        self.engine.place_pillar()
+        self.sync_player()
    
     def update(self, dt):
         """Game logic update called every frame."""
         current_time = Clock.get_time()
         
+        if self.preloader is not None:
+            if self.showing_legend:
+                self.preloader.pump()
+            if not self.showing_legend or self.preloader.finished:
+                self.finish_preload()
+        
         # Handle input
         if self.showing_legend or self.showing_hof or self.entering_name:
             if 'enter' in self.keys_pressed or 'spacebar' in self.keys_pressed:
@@ -313,7 +355,8 @@ class GameWidget(Widget):
             # Game engine update
             current_time = int(Clock.get_time() * 1000)  # Convert to milliseconds
             player_killed = self.engine.update(current_time, (self.player_x, self.player_y))
-            if player_killed:
+            # Firewall resting on the player: the engine's grace delay
+            if player_killed or self.engine.crushed(current_time):
                 self.handle_death()
         
         # Render
@@ -321,12 +364,6 @@ class GameWidget(Widget):
     
     def render(self):
         """Render the game using Kivy Canvas."""
-        self.canvas.clear()
-        
-    def render(self):
-        """Render the game using Kivy Canvas."""
-        self.canvas.clear()
-        
         # --- SPLIT SCREEN LAYOUT ---
         # Top 8% for HUD
         # Middle for Game (Fill available space)
@@ -351,7 +388,8 @@ class GameWidget(Widget):
         self.game_offset_x = offset_x
         self.game_offset_y = offset_y
         
-        with self.canvas:
+        self.backdrop_canvas.clear()
+        with self.backdrop_canvas:
             # 1. Clear Screen (Black)
             Color(0, 0, 0, 1)
             Rectangle(pos=(0, 0), size=(win_w, win_h))
@@ -363,81 +401,17 @@ class GameWidget(Widget):
             # 3. Draw HUD Area (Top Background)
             Color(0.1, 0.1, 0.1, 1)
             Rectangle(pos=(0, win_h - hud_h), size=(win_w, hud_h))
-            
-            # 4. Game Content (Transform Context)
-            PushMatrix()
-            # Apply transform
-            Translate(offset_x, offset_y)
-            Scale(scale, scale, 1)
-            
-            # Game Background
-            Color(*COLOR_BG)
-            Rectangle(pos=(0, 0), size=(SCREEN_WIDTH, SCREEN_HEIGHT))
-            
-            # Draw Grid
-            current_time = PygameShim.time.get_ticks()
-            
-            for y in range(self.grid.height):
-                for x in range(self.grid.width):
-                    cell = self.grid.get_tile(x, y)
-                    px = x * TILE_SIZE
-                    py = (self.grid.height - y - 1) * TILE_SIZE  # Flip Y
-                    
-                    texture = None
-                    
-                    # Special Case: EXIT
-                    if cell == EXIT:
-                        anim_key = "exit_green" if self.keys_collected >= self.required_keys else "exit_red"
-                        if hasattr(self.grid, 'animated_textures') and anim_key in self.grid.animated_textures:
-                            frames = self.grid.animated_textures[anim_key]
-                            if frames:
-                                frame_idx = (current_time // 100) % len(frames)
-                                s = frames[frame_idx]
-                                if s and hasattr(s, 'texture'): texture = s.texture
-                    
-                    # A. Try Animated Textures (Priority)
-                    elif hasattr(self.grid, 'animated_textures') and cell in self.grid.animated_textures:
-                        frames = self.grid.animated_textures[cell]
-                        if frames:
-                            # Determine animation speed
-                            speed = 100
-                            if cell in [PREDATOR, SLUDGE]: speed = 70
-                            elif cell == BOMB: speed = 80
-                            
-                            frame_idx = (current_time // speed) % len(frames)
-                            surface = frames[frame_idx]
-                            if surface and hasattr(surface, 'texture'):
-                                texture = surface.texture
-
-                    # B. Try Static Textures (Fallback)
-                    if not texture and hasattr(self.grid, 'textures') and cell in self.grid.textures:
-                        surface = self.grid.textures[cell]
-                        if surface and hasattr(surface, 'texture'):
-                            texture = surface.texture
-                    
-                    # Render Tile
-                    if texture:
-                        Color(1, 1, 1, 1)
-                        Rectangle(texture=texture, pos=(px, py), size=(TILE_SIZE, TILE_SIZE))
-                    else:
-                        # Color Fallback (same as before)
-                        color = COLOR_EMPTY
-                        if cell == WALL: color = COLOR_WALL
-                        elif cell == DATA: color = COLOR_DATA
-                        elif cell == FIREWALL: color = COLOR_FIREWALL
-                        elif cell == KEY: color = COLOR_KEY
-                        elif cell == EXIT: color = COLOR_EXIT
-                        elif cell == PREDATOR: color = COLOR_PREDATOR
-                        elif cell == BUILDER: color = COLOR_BUILDER
-                        elif cell == GRAVITY_ZONE: color = COLOR_GRAVITY
-                        elif cell == BOMB: color = COLOR_BOMB
-                        elif cell == TELEPORTER: color = COLOR_TELEPORTER
-                        elif cell == PILLAR: color = COLOR_PILLAR
-                        elif cell == SLUDGE: color = COLOR_SLUDGE
-                        
-                        Color(*color)
-                        Rectangle(pos=(px, py), size=(TILE_SIZE, TILE_SIZE))
-            
+        
+        # 4. Game Content (Transform Context)
+        self.game_translate.xy = (offset_x, offset_y)
+        self.game_zoom.x = self.game_zoom.y = scale
+        
+        # Draw Grid: retained, only changed cells and frames are re-textured
+        current_time = PygameShim.time.get_ticks()
+        self.tile_layer.update(self.grid, current_time, self.keys_collected >= self.required_keys)
+        
+        self.overlay_canvas.clear()
+        with self.overlay_canvas:
             # Draw Player
             px = self.player_x * TILE_SIZE
             py = (self.grid.height - self.player_y - 1) * TILE_SIZE
@@ -473,9 +447,12 @@ class GameWidget(Widget):
                 Color(1, 1, 1, 1)
                 self.draw_text("BOULDERFLASH", SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT - 100, size=32)
                 self.draw_text("Tap SCREEN to Start", SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2)
-            
-            PopMatrix()
-            
+                if self.preloader is not None:
+                    self.draw_text(f"Loading assets {self.preloader.progress:.0%}",
+                                   SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2 - 40, size=14)
+        
+        self.hud_canvas.clear()
+        with self.hud_canvas:
             # 5. Draw HUD Text (Top Area)
             cy = win_h - hud_h/2 - 10 # Centered vertically in top bar
             # Split into 3 columns
@@ -483,12 +460,28 @@ class GameWidget(Widget):
             self.draw_text(f"Lives: {self.lives}", 20, cy, size=20)
             self.draw_text(f"Keys: {self.keys_collected}/{self.required_keys}", col_w + 20, cy, size=20)
             self.draw_text(f"Bombs: {self.bombs_count}", col_w*2 + 20, cy, size=20)
+            
+            # Debug overlay: engine timings and work counters
+            if self.stats is not None:
+                self.draw_stats_overlay(win_h - hud_h)
 
             # 6. Draw Virtual Controls (Bottom Area)
             if self.is_mobile:
                 self.draw_virtual_controls_fixed(win_w, controls_h)
 
 
+    def draw_stats_overlay(self, top):
+        lines = self.stats.lines()
+        line_h = 16
+        Color(0, 0, 0, 0.7)
+        Rectangle(pos=(10, top - 10 - line_h * len(lines)), size=(460, line_h * len(lines) + 10))
+        for n, line in enumerate(lines):
+            self.draw_text(line, 15, top - 5 - line_h * (n + 1), size=12, color=(0.4, 1, 0.4, 1))
+    
+    def toggle_stats(self):
+        self.stats = None if self.stats is not None else EngineStats()
+        self.engine.stats = self.stats
+    
     def get_player_texture(self):
         """Helper to lazy-load and return player texture."""
         if hasattr(self, '_player_tex'): return self._player_tex
@@ -604,13 +597,10 @@ class GameWidget(Widget):
                     elif name == "right":
                         self.move_player(1, 0)
                         self.facing_left = False
-                    elif name == "bomb" and self.bombs_count > 0:
-                        self.bombs_count -= 1
-                        self.engine.active_bombs.append((self.player_x, self.player_y, 10))
-                        self.grid.set_tile(self.player_x, self.player_y, BOMB)
-                    elif name == "pillar" and self.pillars_count > 0:
-                        self.pillars_count -= 1
-                        self.grid.set_tile(self.player_x, self.player_y, PILLAR)
+                    elif name == "bomb":
+                        self.place_bomb()
+                    elif name == "pillar":
+                        self.place_pillar()
                     return True
 
         return super().on_touch_down(touch)
@@ -626,20 +616,18 @@ class GameWidget(Widget):
         elif key == 32: key_name = 'spacebar'
         elif key == 13: key_name = 'enter'
         elif key == 27: key_name = 'escape'
+        elif key == 284: key_name = 'f3'
         
         if key_name:
             self.keys_pressed.add(key_name)
         
         # Immediate actions
         if key_name == 'spacebar':
-             if self.bombs_count > 0:
-                 self.engine.active_bombs.append((self.player_x, self.player_y, 10))
-                 self.grid.set_tile(self.player_x, self.player_y, BOMB)
-                 self.bombs_count -= 1
+             self.place_bomb()
         elif key_name == 'lctrl':
-             if self.pillars_count > 0:
-                 self.grid.set_tile(self.player_x, self.player_y, PILLAR)
-                 self.pillars_count -= 1
+             self.place_pillar()
+        elif key_name == 'f3':
+             self.toggle_stats()
                  
     def on_key_up(self, window, key, *args):
         """Handle key release."""
@@ -677,8 +665,17 @@ class BoulderflashApp(App):
     
     def build(self):
         self.title = "Cyber-Hacker: Hacking the Mainframe"
-        game = GameWidget()
-        return game
+        self.game = GameWidget()
+        return self.game
+    
+    def on_stop(self):
+        # Last session log, for replay.py
+        self.game.save_session()
+    
+    def on_pause(self):
+        # Android may kill a paused app without on_stop
+        self.game.save_session()
+        return True
 
 
 if __name__ == '__main__':
@@ -13,15 +13,17 @@ if current_dir not in sys.path:
 import pygame
 from constants import (
     SCREEN_WIDTH, SCREEN_HEIGHT, HUD_WIDTH, TILE_SIZE, FPS, 
-    COLOR_BG, COLOR_HACKER, COLOR_DATA, COLOR_WALL, COLOR_FIREWALL, 
-    COLOR_EMPTY, COLOR_KEY, COLOR_EXIT, COLOR_PREDATOR, COLOR_BUILDER, 
+    COLOR_BG, COLOR_HACKER, COLOR_WALL, COLOR_FIREWALL, 
+    COLOR_KEY, COLOR_EXIT, COLOR_PREDATOR, COLOR_BUILDER, 
     COLOR_GRAVITY, COLOR_BOMB, COLOR_TELEPORTER, COLOR_PILLAR, COLOR_SLUDGE,
-    EMPTY, DATA, WALL, FIREWALL, KEY, EXIT, PLAYER, PREDATOR, BUILDER, 
+    DATA, WALL, FIREWALL, KEY, EXIT, PLAYER, PREDATOR, BUILDER, 
     GRAVITY_ZONE, BOMB, TELEPORTER, PILLAR, SLUDGE
 )
-from grid import Grid
+from grid import Grid, texture_assets
 from engine import Engine
-from levels import LEVELS
+import level_cache
+import textures
+from replay import Recorder
 from utils import resource_path
 import scores
 
@@ -44,8 +46,11 @@ class Game:
         self.clock = pygame.time.Clock()
         
         # Initialize attributes
-        self.grid = Grid(1, 1)
+        self.grid = Grid(1, 1, load_graphics=False)
         self.engine = Engine(self.grid)
+        # Les images de la grille se décodent en arrière-plan pendant la légende
+        textures.use_atlas() # Si texture_atlas.py l'a construit
+        self.preloader = textures.Preloader(textures.atlas_pages() or texture_assets())
         self.player_x = 0
         self.player_y = 0
         self.keys_collected = 0
@@ -182,20 +187,43 @@ class Game:
                 print(f"Error loading background: {e}")
 
     def load_level(self, index):
-        if index >= len(LEVELS):
+        if index >= level_cache.level_count():
             return
 
-        map_str = LEVELS[index].strip()
-        lines = map_str.split('\n')
-        height = len(lines)
-        width = len(lines[0])
+        # Niveau précompilé (level_cache) : une copie de tampon, sans parsing
+        level = level_cache.get_level(index)
+        map_str = level_cache.map_string(level) # Pour le journal de la partie
         
-        self.grid = Grid(width, height)
+        self.grid = Grid.from_bytes(level.width, level.height, level.tiles,
+                                    load_graphics=self.preloader is None)
         self.engine = Engine(self.grid)
+        self.reset_play_state()
+        self.player_x, self.player_y = level.spawn
+        self.engine.gravity_zones.update(level.gravity_zones)
+        self.engine.teleporters = level.teleporters
         
-        # Reset State
+        self.engine.load_enemies()
+        player = self.engine.spawn_player(self.player_x, self.player_y, self.bombs_count, self.pillars_count)
+        self.required_keys = player.required_keys
+        # Départ du niveau, pour recommencer après une mort sans tout reconstruire
+        self.level_start = (index, map_str, self.engine.snapshot())
+        # Journal de la partie, sauvegardé à la mort ou à la victoire (replay.py)
+        self.recorder = Recorder(self.engine, map_str, level=index)
+
+    def restart_level(self):
+        """Back to the start of the current level after a death."""
+        index, map_str, start = self.level_start
+        if index != self.current_level_index:
+            self.load_level(self.current_level_index)
+            return
+        self.engine.restore(start)
+        self.reset_play_state()
+        player = self.engine.player
+        self.player_x, self.player_y = player.x, player.y
+        self.recorder = Recorder(self.engine, map_str, level=index)
+
+    def reset_play_state(self):
         self.keys_collected = 0
-        self.required_keys = 0
         self.game_over = False
         self.won = False
         
@@ -214,38 +242,16 @@ class Game:
         # Tools
         self.bombs_count = 5
         self.pillars_count = 3
-        
-        # Parse Level
-        self.engine.gravity_zones.clear()
-        for y, line in enumerate(lines):
-            for x, char in enumerate(line):
-                if char == '#': self.grid.set_tile(x, y, WALL)
-                elif char == '*': self.grid.set_tile(x, y, DATA)
-                elif char == 'F': self.grid.set_tile(x, y, FIREWALL)
-                elif char == 'K': 
-                    self.grid.set_tile(x, y, KEY)
-                    self.required_keys += 1
-                elif char == 'P':
-                    self.player_x = x
-                    self.player_y = y
-                    self.grid.set_tile(x, y, EMPTY)
-                elif char == 'A': self.grid.set_tile(x, y, PREDATOR)
-                elif char == 'B': self.grid.set_tile(x, y, BUILDER)
-                elif char == 'G': 
-                    self.grid.set_tile(x, y, GRAVITY_ZONE)
-                    self.engine.gravity_zones.add((x, y))
-                elif char == 'X': self.grid.set_tile(x, y, EXIT)
-                elif char == 'T': self.grid.set_tile(x, y, TELEPORTER)
-                elif char == 'S': self.grid.set_tile(x, y, SLUDGE)
-                elif char == '.': self.grid.set_tile(x, y, EMPTY)
-        
-        if self.required_keys == 0: self.required_keys = 1
 
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.showing_quit_confirm = True
                 continue
+            if event.type == getattr(pygame, "APP_LOWMEMORY", None):
+                # Android : libérer les textures en cache, rechargées à la demande
+                textures.on_low_memory()
+                continue
 
             if self.is_mobile and (event.type == pygame.MOUSEBUTTONDOWN or event.type == pygame.FINGERDOWN):
                 pos = event.pos if event.type == pygame.MOUSEBUTTONDOWN else (event.x * SCREEN_WIDTH, event.y * SCREEN_HEIGHT)
@@ -287,7 +293,7 @@ class Game:
 
                 if self.game_over:
                     if self.won:
-                        if self.current_level_index < len(LEVELS) - 1:
+                        if self.current_level_index < level_cache.level_count() - 1:
                             self.current_level_index += 1
                             self.load_level(self.current_level_index)
                         else:
@@ -298,7 +304,7 @@ class Game:
                             self.entering_name = True
                             self.game_over = False
                         else:
-                            self.load_level(self.current_level_index)
+                            self.restart_level()
                     continue
 
                 # Game controls
@@ -391,7 +397,7 @@ class Game:
                         continue
                     if event.key == pygame.K_r:
                         if self.won:
-                            if self.current_level_index < len(LEVELS) - 1:
+                            if self.current_level_index < level_cache.level_count() - 1:
                                 self.current_level_index += 1
                                 self.load_level(self.current_level_index)
                             else:
@@ -403,7 +409,7 @@ class Game:
                                 self.entering_name = True
                                 self.game_over = False
                             else:
-                                self.load_level(self.current_level_index)
+                                self.restart_level()
                 return
 
             if event.type == pygame.KEYDOWN:
@@ -435,18 +441,22 @@ class Game:
                 # Supprimé : l'idle est maintenant géré par le timer dans update()
 
     def place_bomb(self):
-        if self.bombs_count > 0:
-            self.engine.active_bombs.append((self.player_x, self.player_y, 10))
-            self.grid.set_tile(self.player_x, self.player_y, BOMB)
-            self.bombs_count -= 1
+        self.engine.place_bomb()
+        self.bombs_count = self.engine.player.bombs
 
     def place_pillar(self):
-        if self.pillars_count > 0:
-            self.grid.set_tile(self.player_x, self.player_y, PILLAR)
-            self.pillars_count -= 1
+        self.engine.place_pillar()
+        self.pillars_count = self.engine.player.pillars
+
+    def save_session(self):
+        try:
+            self.recorder.save()
+        except Exception as e:
+            print(f"Error saving session: {e}")
 
     def handle_death(self):
         """Unified method to trigger death animation and state."""
+        self.save_session()
         self.lives -= 1
         self.crush_time = 0 # Reset
         self.game_over = True
@@ -469,74 +479,52 @@ class Game:
             })
 
     def move_player(self, dx, dy):
-        new_x = self.player_x + dx
-        new_y = self.player_y + dy
-        target_tile = self.grid.get_tile(new_x, new_y)
+        # Les règles de déplacement vivent dans le moteur
+        player = self.engine.player
+        outcome = self.engine.move_player(dx, dy)
+        self.player_x, self.player_y = player.x, player.y
+        self.keys_collected = player.keys
         
-        if target_tile in [WALL, PILLAR]: return
-
-        if target_tile == TELEPORTER:
-            for y in range(self.grid.height):
-                for x in range(self.grid.width):
-                    if self.grid.get_tile(x, y) == TELEPORTER and (x != new_x or y != new_y):
-                        self.player_x = x
-                        self.player_y = y
-                        return
-            return
-
-        if target_tile == KEY:
-            self.keys_collected += 1
-            self.player_x = new_x
-            self.player_y = new_y
-            self.grid.set_tile(new_x, new_y, EMPTY)
-        elif target_tile == EXIT:
-            if self.keys_collected >= self.required_keys:
-                self.won = True
-                self.game_over = True
-                self.anim_state = "victory"
-                self.anim_frame = 0
-                self.player_x = new_x
-                self.player_y = new_y
-                # Initialize victory animation
-                self.victory_zoom = 1.0
-                self.victory_start_time = pygame.time.get_ticks()
-                # Create particle burst
-                import random
-                import math
-                for _ in range(20):
-                    angle = random.uniform(0, 2 * 3.14159)
-                    speed = random.uniform(50, 150)
-                    self.victory_particles.append({
-                        'x': new_x, 'y': new_y,
-                        'vx': speed * math.cos(angle), 'vy': speed * math.sin(angle),
-                        'life': random.uniform(0.5, 1.5)
-                    })
-        elif target_tile == PREDATOR or target_tile == SLUDGE:
+        if outcome == "won":
+            self.save_session()
+            self.won = True
+            self.game_over = True
+            self.anim_state = "victory"
+            self.anim_frame = 0
+            # Initialize victory animation
+            self.victory_zoom = 1.0
+            self.victory_start_time = pygame.time.get_ticks()
+            # Create particle burst
+            import random
+            import math
+            for _ in range(20):
+                angle = random.uniform(0, 2 * 3.14159)
+                speed = random.uniform(50, 150)
+                self.victory_particles.append({
+                    'x': player.x, 'y': player.y,
+                    'vx': speed * math.cos(angle), 'vy': speed * math.sin(angle),
+                    'life': random.uniform(0.5, 1.5)
+                })
+        elif outcome == "dead":
             # Immediate death on contact
-            self.player_x, self.player_y = new_x, new_y
-            self.handle_death()
-            return
-        elif target_tile in [DATA, EMPTY]:
-            self.player_x = new_x
-            self.player_y = new_y
-            self.grid.set_tile(new_x, new_y, EMPTY)
-        elif target_tile == FIREWALL and dy == 0:
-            next_tile = self.grid.get_tile(new_x + dx, new_y)
-            if next_tile in [EMPTY, GRAVITY_ZONE]:
-                self.grid.set_tile(new_x + dx, new_y, FIREWALL)
-                # Restaurer le tile d'origine s'il s'agissait d'une zone de gravité
-                original_tile = GRAVITY_ZONE if (new_x, new_y) in self.engine.gravity_zones else EMPTY
-                self.grid.set_tile(new_x, new_y, original_tile)
-                self.player_x = new_x
-                self.player_y = new_y
-        elif target_tile == PREDATOR:
-            self.player_x, self.player_y = new_x, new_y
             self.handle_death()
         
+    def finish_preload(self):
+        """Upload whatever the preloader has left and give the grid its textures."""
+        self.preloader.finish()
+        self.preloader = None
+        self.grid.load_textures()
+
     def update(self):
         # Update Animation
         now = pygame.time.get_ticks()
         
+        if self.preloader is not None:
+            if self.showing_legend:
+                self.preloader.pump()
+            if not self.showing_legend or self.preloader.finished:
+                self.finish_preload()
+        
         # Revenir en idle après 1 seconde sans mouvement
         if self.anim_state == "run" and now - self.last_move_time > 1000:
             self.anim_state = "idle"
@@ -732,6 +720,9 @@ class Game:
         else:
             prompt = prompt_font.render(">>> PRESS ANY KEY TO INITIALIZE <<<", True, COLOR_HACKER)
         self.screen.blit(prompt, (SCREEN_WIDTH//2 - prompt.get_width()//2, 605))
+        if self.preloader is not None:
+            loading = text_font.render(f"LOADING ASSETS {self.preloader.progress:.0%}", True, (100, 200, 255))
+            self.screen.blit(loading, (SCREEN_WIDTH//2 - loading.get_width()//2, 640))
         
         pygame.display.flip()
 
@@ -835,7 +826,7 @@ class Game:
             self.screen.blit(overlay, (0, 0))
             big_font = pygame.font.SysFont("Consolas", 50)
             if self.won:
-                if self.current_level_index < len(LEVELS) - 1:
+                if self.current_level_index < level_cache.level_count() - 1:
                     msg = big_font.render("ACCESS GRANTED", True, (0, 255, 100))
                     sub = self.ui_font.render("PRESS R FOR NEXT NODE", True, (255, 255, 255))
                 else:
@@ -0,0 +1,152 @@
+"""
+Session recording and replay for Boulderflash.
+A session log is the level, the engine seed, the player's inputs as
+(tick, action) events, the tick times and a hash of the grid after every
+tick. Replaying runs the engine headless as fast as it goes and checks the
+hashes, so a session from a device becomes a regression case.
+
+    python replay.py last_session.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from engine import Engine, MOVES
+
+LOG_VERSION = 3
+
+
+def get_replay_path():
+    """Where the frontends save the last session (same place as the scores)."""
+    try:
+        # Android: Use app's private storage
+        from android.storage import app_storage_path
+        return os.path.join(app_storage_path(), "last_session.json")
+    except ImportError:
+        # Desktop/other: Use current directory
+        return "last_session.json"
+
+
+def grid_hash(engine):
+    """Zobrist hash of the tiles, the player's square and keys."""
+    return engine.grid.zobrist
+
+
+class ReplayMismatch(RuntimeError):
+    """The replayed grid differs from the recorded one."""
+
+    def __init__(self, tick, expected, actual):
+        super().__init__(f"Replay diverged at tick {tick}: hash {actual:016x}, recorded {expected:016x}")
+        self.tick = tick
+
+
+class Recorder:
+    """Logs the inputs and tick hashes of one engine; attach before the first tick."""
+
+    def __init__(self, engine, map_str, level=None, backend="python"):
+        player = engine.player
+        self.log = {
+            "version": LOG_VERSION,
+            "level": level,
+            "map": map_str.strip(),
+            "seed": engine.seed,
+            "backend": backend,
+            "player": [player.x, player.y, player.bombs, player.pillars],
+            "inputs": [],   # [tick, action]: action sent after `tick` ticks
+            "times": [],    # [delta_ms, count]: tick times, run-length encoded
+            "hashes": [],   # grid_hash after each tick
+        }
+        self.last_time = engine.current_time
+        engine.recorder = self
+
+    def input(self, engine, action):
+        self.log["inputs"].append([engine.ticks, action])
+
+    def tick(self, engine):
+        delta = engine.current_time - self.last_time
+        self.last_time = engine.current_time
+        times = self.log["times"]
+        if times and times[-1][0] == delta:
+            times[-1][1] += 1
+        else:
+            times.append([delta, 1])
+        self.log["hashes"].append(grid_hash(engine))
+
+    def save(self, path=None):
+        with open(path or get_replay_path(), "w") as f:
+            json.dump(self.log, f, separators=(",", ":"))
+
+
+def load(path):
+    with open(path) as f:
+        log = json.load(f)
+    if log.get("version") != LOG_VERSION:
+        raise ValueError(f"Unsupported replay version: {log.get('version')}")
+    return log
+
+
+def replay(log, verify=True):
+    """Run a session log on a fresh headless engine and return the engine.
+
+    Raises ReplayMismatch at the first tick whose grid hash differs.
+    """
+    engine = Engine.from_level(log["map"], seed=log["seed"], backend=log.get("backend", "python"))
+    player = engine.player
+    player.x, player.y, player.bombs, player.pillars = log["player"]
+    inputs = iter(log["inputs"])
+    pending = next(inputs, None)
+    hashes = log["hashes"]
+    for delta, count in log["times"]:
+        for _ in range(count):
+            # Inputs sent before this tick
+            while pending is not None and pending[0] <= engine.ticks:
+                send(engine, pending[1])
+                pending = next(inputs, None)
+            engine.clock.advance(delta)
+            engine.tick(engine.clock(), (player.x, player.y))
+            if verify:
+                actual = grid_hash(engine)
+                expected = hashes[engine.ticks - 1]
+                if actual != expected:
+                    raise ReplayMismatch(engine.ticks, expected, actual)
+    while pending is not None: # Sent after the last tick, e.g. the move onto the exit
+        send(engine, pending[1])
+        pending = next(inputs, None)
+    return engine
+
+
+def send(engine, action):
+    # Comme à l'enregistrement : la règle d'écrasement en descendant reste
+    # au frontend, on rejoue seulement le mouvement
+    if action == "bomb":
+        engine.place_bomb()
+    elif action == "pillar":
+        engine.place_pillar()
+    else:
+        engine.move_player(*MOVES[action])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded session headless.")
+    parser.add_argument("log", help="session log (JSON)")
+    parser.add_argument("--no-verify", action="store_true", help="skip the per-tick hash checks")
+    args = parser.parse_args(argv)
+
+    log = load(args.log)
+    start = time.perf_counter()
+    try:
+        engine = replay(log, verify=not args.no_verify)
+    except ReplayMismatch as e:
+        print(e)
+        return 1
+    elapsed = time.perf_counter() - start
+    rate = engine.ticks / elapsed if elapsed else 0
+    print(f"{engine.ticks} ticks replayed in {elapsed * 1000:.1f} ms ({rate:.0f} ticks/s), "
+          f"{len(log['inputs'])} inputs" + ("" if args.no_verify else ", grid hashes match"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Level solver for Boulderflash.
+Weighted A* over the headless engine, one player action per physics tick.
+Search states are Engine.snapshot() bytes, compressed with the RNG state
+shared between the states that have the same; a node keeps its parent and
+action instead of its whole path, and the open list is capped. A capped
+transposition table, keyed on the grid's Zobrist hash, drops states already
+reached with the same tiles, player and bombs. Levels are solved in a process pool, and a
+single level can be split at the root across workers, where the first
+verified solution stops the others. A found solution is replayed with
+Engine.step before it counts.
+
+    python solver.py                    # every level
+    python solver.py --levels 5 --split # one level, root split over all cores
+"""
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from benchmark import parse_levels
+from constants import WALL, PILLAR, KEY, EXIT
+from engine import Engine, SNAPSHOT_HEADER, SNAPSHOT_ENEMY, SNAPSHOT_BOMB, SNAPSHOT_ZONE, SNAPSHOT_RNG
+from levels import LEVELS
+
+MOVES = ("up", "down", "left", "right", None) # None : attendre un tick
+TOOLS = ("bomb", "pillar")
+
+
+def state_key(engine):
+    """Transposition key: tiles, player and bombs, but not timers or RNG."""
+    player = engine.player
+    return (engine.grid.zobrist, player.bombs, player.pillars, tuple(engine.active_bombs))
+
+
+class TranspositionTable:
+    """Seen states -> best tick count, holding at most max_entries."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def visit(self, key, ticks):
+        """True if the state is new or reached faster than before."""
+        best = self.entries.get(key)
+        if best is not None and best <= ticks:
+            return False
+        if best is None and len(self.entries) >= self.max_entries:
+            # Plein : on oublie la plus ancienne moitié
+            for old in list(self.entries)[:self.max_entries // 2]:
+                del self.entries[old]
+        self.entries[key] = ticks
+        return True
+
+
+def rng_offset(data):
+    """Where the RNG state starts in Engine.snapshot() bytes."""
+    *_, n_enemies, n_bombs, n_zones = SNAPSHOT_HEADER.unpack_from(data)
+    return (SNAPSHOT_HEADER.size + n_enemies * SNAPSHOT_ENEMY.size
+            + n_bombs * SNAPSHOT_BOMB.size + n_zones * SNAPSHOT_ZONE.size)
+
+
+def pack_state(snapshot, rng_states):
+    """A snapshot as (compressed bytes without the RNG state, RNG state).
+
+    The RNG state (2.5 KB that does not compress) is interned in
+    rng_states: on levels without sludge or replicators every state shares
+    one, and elsewhere the siblings that drew nothing share their parent's.
+    """
+    start = rng_offset(snapshot)
+    end = start + SNAPSHOT_RNG.size
+    rng = snapshot[start:end]
+    return zlib.compress(snapshot[:start] + snapshot[end:], 1), rng_states.setdefault(rng, rng)
+
+
+def unpack_state(state):
+    data, rng = state
+    data = zlib.decompress(data)
+    start = rng_offset(data)
+    return data[:start] + rng + data[start:]
+
+
+def distances_from(grid, starts):
+    """BFS over every square but walls and pillars; offset -> distance."""
+    cells = grid.cells
+    stride = grid.stride
+    distance = dict.fromkeys(starts, 0)
+    frontier = list(starts)
+    d = 0
+    while frontier:
+        d += 1
+        next_frontier = []
+        for i in frontier:
+            for j in (i + 1, i - 1, i + stride, i - stride):
+                if j not in distance and cells[j] != WALL and cells[j] != PILLAR:
+                    distance[j] = d
+                    next_frontier.append(j)
+        frontier = next_frontier
+    return distance
+
+
+def heuristic(engine, exit_distance, key_distance):
+    """Squares along a greedy tour of the missing keys, then to the exit;
+    None if the level can no longer be won.
+
+    exit_distance and key_distance (key offset -> distances_from(grid, [key]))
+    are BFS maps of the level start, so no search runs per node. The first
+    leg uses the key's map, or the Manhattan distance for a key that has
+    fallen since; the legs between keys are Manhattan distances.
+    """
+    grid = engine.grid
+    player = engine.player
+    start = grid.index(player.x, player.y)
+    missing = player.required_keys - player.keys
+    if missing <= 0:
+        return exit_distance.get(start)
+    keys = [k for k in grid.positions(KEY) if grid.index(*k) in exit_distance]
+    if len(keys) < missing:
+        return None # Des clés ont été détruites ou emmurées
+    best = None
+    for k in keys:
+        distance = key_distance.get(grid.index(*k))
+        d = distance.get(start) if distance is not None else abs(k[0] - player.x) + abs(k[1] - player.y)
+        if d is not None and (best is None or d < best[0]):
+            best = (d, k)
+    if best is None:
+        return None
+    total, (x, y) = best
+    keys.remove((x, y))
+    for _ in range(missing - 1):
+        nearest = min(keys, key=lambda k: abs(k[0] - x) + abs(k[1] - y))
+        keys.remove(nearest)
+        total += abs(nearest[0] - x) + abs(nearest[1] - y)
+        x, y = nearest
+    return total + exit_distance[grid.index(x, y)]
+
+
+def unwind(node, parents, moves, actions):
+    """The actions from the root to node."""
+    path = []
+    while node > 0:
+        path.append(actions[moves[node]])
+        node = parents[node]
+    path.reverse()
+    return path
+
+
+def search(index, seed=0, prefix=(), max_nodes=50000, max_seconds=60.0, weight=3.0,
+           table_size=1_000_000, max_open=20000, tools=True, stop=None):
+    """Weighted A* from the level start, after playing prefix.
+
+    When the open list outgrows max_open, its best half is kept. The search
+    gives up early once the stop event (if any) is set.
+    Returns (solution actions or None, nodes expanded).
+    """
+    engine = Engine.from_level(LEVELS[index], seed=seed)
+    actions = MOVES + (TOOLS if tools else ())
+    if prefix and engine.step(len(prefix), list(prefix)) is not None:
+        return None, 0
+    table = TranspositionTable(table_size)
+    rng_states = {}
+    grid = engine.grid
+    exit_distance = distances_from(grid, [grid.index(x, y) for x, y in grid.positions(EXIT)])
+    key_distance = {grid.index(x, y): distances_from(grid, [grid.index(x, y)]) for x, y in grid.positions(KEY)}
+    h = heuristic(engine, exit_distance, key_distance)
+    if h is None:
+        return None, 0
+    table.visit(state_key(engine), 0)
+    # Node n was reached from parents[n] by actions[moves[n]]; node 0 is the root
+    parents = array("l", [-1])
+    moves = bytearray(1)
+    open_list = [(weight * h, 0, 0, pack_state(engine.snapshot(), rng_states))]
+    expanded = 0
+    deadline = time.perf_counter() + max_seconds
+
+    while open_list and expanded < max_nodes and time.perf_counter() < deadline:
+        if stop is not None and expanded % 256 == 0 and stop.is_set():
+            break
+        _, node, g, state = heapq.heappop(open_list)
+        state = unpack_state(state)
+        expanded += 1
+        for move, action in enumerate(actions):
+            engine.restore(state)
+            if action is not None:
+                # Un coup bloqué donne le même état qu'attendre : déjà couvert par None
+                outcome = engine.apply_input(action)
+                if outcome == "blocked" or outcome == "dead":
+                    continue
+                if outcome == "won":
+                    return list(prefix) + unwind(node, parents, moves, actions) + [action], expanded
+            outcome = engine.step(1)
+            if outcome == "won":
+                return list(prefix) + unwind(node, parents, moves, actions) + [action], expanded
+            if outcome == "dead":
+                continue
+            if table.visit(state_key(engine), g + 1):
+                h = heuristic(engine, exit_distance, key_distance)
+                if h is None:
+                    continue
+                parents.append(node)
+                moves.append(move)
+                heapq.heappush(open_list, (g + 1 + weight * h, len(parents) - 1, g + 1,
+                                           pack_state(engine.snapshot(), rng_states)))
+        if len(open_list) > max_open:
+            # nsmallest rend une liste triée, donc déjà un tas
+            open_list = heapq.nsmallest(max_open // 2, open_list)
+            live = {rng for *_, (_, rng) in open_list}
+            rng_states = {rng: rng for rng in live}
+    return None, expanded
+
+
+def verify(index, seed, solution):
+    """Replay a solution on a fresh engine; True if it reaches the exit."""
+    engine = Engine.from_level(LEVELS[index], seed=seed)
+    return engine.step(len(solution), solution) == "won"
+
+
+def solve_level(index, seed=0, **options):
+    start = time.perf_counter()
+    solution, expanded = search(index, seed, **options)
+    solved = solution is not None and verify(index, seed, solution)
+    return {
+        "level": index,
+        "solved": solved,
+        "ticks": len(solution) if solved else None,
+        "nodes": expanded,
+        "seconds": round(time.perf_counter() - start, 2),
+        "solution": solution if solved else None,
+    }
+
+
+def solve_split(index, seed=0, jobs=None, **options):
+    """Search each first action in its own process; the first verified solution wins.
+
+    It then stops the other searches: waiting for them would only trade time
+    for a possibly shorter solution, which weighted A* does not promise anyway.
+    """
+    actions = MOVES + (TOOLS if options.get("tools", True) else ())
+    start = time.perf_counter()
+    best = None
+    expanded = 0
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        stop = manager.Event()
+        futures = [pool.submit(search, index, seed, (action,), stop=stop, **options) for action in actions]
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            solution, nodes = future.result()
+            expanded += nodes
+            if best is None and solution is not None and verify(index, seed, solution):
+                best = solution
+                # Les recherches pas encore lancées sont annulées, les autres voient stop
+                stop.set()
+                for other in futures:
+                    other.cancel()
+    return {
+        "level": index,
+        "solved": best is not None,
+        "ticks": len(best) if best else None,
+        "nodes": expanded,
+        "seconds": round(time.perf_counter() - start, 2),
+        "solution": best,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prove levels solvable with a search over the engine.")
+    parser.add_argument("--levels", default="all", help="'all', '0-9' or '1,4,7' (0-based)")
+    parser.add_argument("--seed", type=int, default=0, help="engine seed (sludge and replicators)")
+    parser.add_argument("--nodes", type=int, default=50000, help="node budget per search")
+    parser.add_argument("--seconds", type=float, default=60.0, help="time budget per search")
+    parser.add_argument("--weight", type=float, default=3.0, help="A* heuristic weight (1 = optimal)")
+    parser.add_argument("--table", type=int, default=1_000_000, help="transposition table entries")
+    parser.add_argument("--open", type=int, default=20000, help="open list entries kept at most")
+    parser.add_argument("--no-tools", action="store_true", help="never use bombs or pillars")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--split", action="store_true", help="split each level's root across the workers")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    options = dict(max_nodes=args.nodes, max_seconds=args.seconds, weight=args.weight,
+                   table_size=args.table, max_open=args.open, tools=not args.no_tools)
+    levels = parse_levels(args.levels)
+    results = []
+
+    def report(result):
+        results.append(result)
+        status = f"solved in {result['ticks']} ticks" if result["solved"] else "not solved"
+        print(f"level {result['level'] + 1}: {status} ({result['nodes']} nodes, {result['seconds']} s)")
+
+    if args.split:
+        for index in levels:
+            report(solve_split(index, args.seed, args.jobs, **options))
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs or os.cpu_count()) as pool:
+            futures = [pool.submit(solve_level, index, args.seed, **options) for index in levels]
+            for future in as_completed(futures):
+                report(future.result())
+    results.sort(key=lambda r: r["level"])
+
+    solved = sum(r["solved"] for r in results)
+    print(f"{solved}/{len(results)} levels solved")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"seed": args.seed, "levels": results}, f, indent=2)
+    return 0 if solved == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
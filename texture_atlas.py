@@ -0,0 +1,125 @@
+"""
+Texture atlas builder for Boulderflash.
+Packs every tile and animation frame the grid uses, already scaled, into
+one or a few PNG pages plus a Kivy-format .atlas index ({page: {id: [x, y,
+w, h]}}, y from the bottom). With the atlas present, textures.use_atlas()
+serves the frames as regions of the pages, so drawing a level touches one
+texture instead of ~80; without it the game loads the files one by one.
+
+Needs Pillow, at build time only:
+
+    python texture_atlas.py            # -> assets/tiles.atlas, assets/tiles-0.png
+"""
+import argparse
+import json
+import os
+import sys
+
+from constants import TILE_SIZE
+from grid import STATIC_ASSETS, TELEPORTER_SHEET, EXIT_ASSETS, ANIMATED_ASSETS, EXPLOSION_ASSETS
+from utils import resource_path
+
+ATLAS_NAME = "tiles"
+PADDING = 2 # Pixels entre deux images, contre les débordements du filtrage
+
+
+def atlas_frames():
+    """[(id, file, frame index or None, count, size)] for every image Grid.load_textures uses.
+
+    ids are the keys textures.get() and textures.sheet() look up.
+    """
+    tile = (TILE_SIZE, TILE_SIZE)
+    frames = [(name, name, None, 1, tile) for name in STATIC_ASSETS.values()]
+    sheet, count = TELEPORTER_SHEET
+    frames += [(f"{sheet}#{i}", sheet, i, count, tile) for i in range(count)]
+    patterns = [(pattern, count, tile) for pattern, count in EXIT_ASSETS.values()]
+    patterns.append(("sortie_green_.png", 1, tile))
+    patterns += [(pattern, count, tile) for _, pattern, count in ANIMATED_ASSETS]
+    patterns.append((*EXPLOSION_ASSETS, (TILE_SIZE * 3, TILE_SIZE * 3)))
+    for pattern, count, size in patterns:
+        names = [pattern.format(i) for i in range(count)] if count > 1 else [pattern]
+        frames += [(name, name, None, 1, size) for name in names]
+    return frames
+
+
+def pack_shelves(sizes, max_side):
+    """Shelf packing: sizes [(w, h)] -> ([(page, x, y)], [(page_w, page_h)]), y from the top."""
+    if any(w > max_side or h > max_side for w, h in sizes):
+        raise ValueError(f"An image is larger than a {max_side} px page")
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    places = [None] * len(sizes)
+    pages = []
+    page = x = y = shelf_h = 0
+    used_w = 0
+    for i in order:
+        w, h = sizes[i]
+        if x + w > max_side: # Étagère pleine : on passe à la suivante
+            x, y = 0, y + shelf_h + PADDING
+            shelf_h = 0
+        if y + h > max_side: # Page pleine : elle s'arrête au bas de la dernière étagère
+            pages.append((used_w, y - PADDING))
+            page += 1
+            x = y = shelf_h = used_w = 0
+        places[i] = (page, x, y)
+        x += w + PADDING
+        used_w = max(used_w, x - PADDING)
+        shelf_h = max(shelf_h, h)
+    pages.append((used_w, y + shelf_h))
+    assert all(w <= max_side and h <= max_side for w, h in pages), pages
+    return places, pages
+
+
+def build_atlas(output_dir, name=ATLAS_NAME, max_side=2048):
+    """Write <name>.atlas and <name>-N.png into output_dir; returns the frame count."""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("Building the atlas needs Pillow: pip install pillow")
+
+    images = []
+    sheets = {}
+    for frame_id, filename, index, count, size in atlas_frames():
+        path = resource_path(os.path.join("assets", filename))
+        if not os.path.exists(path):
+            continue
+        if index is None:
+            image = Image.open(path).convert("RGBA")
+        else:
+            if filename not in sheets:
+                sheets[filename] = Image.open(path).convert("RGBA")
+            sheet = sheets[filename]
+            frame_w = sheet.width // count
+            image = sheet.crop((index * frame_w, 0, (index + 1) * frame_w, sheet.height))
+        images.append((frame_id, image.resize(size, Image.LANCZOS)))
+
+    places, page_sizes = pack_shelves([image.size for _, image in images], max_side)
+    pages = [Image.new("RGBA", size, (0, 0, 0, 0)) for size in page_sizes]
+    index = {f"{name}-{i}.png": {} for i in range(len(pages))}
+    for (frame_id, image), (page, x, y) in zip(images, places):
+        pages[page].paste(image, (x, y))
+        # Format .atlas de Kivy : origine en bas à gauche
+        w, h = image.size
+        index[f"{name}-{page}.png"][frame_id] = [x, page_sizes[page][1] - y - h, w, h]
+    for i, page in enumerate(pages):
+        page.save(os.path.join(output_dir, f"{name}-{i}.png"))
+    with open(os.path.join(output_dir, f"{name}.atlas"), "w") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    return len(images)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack the grid's tile frames into a texture atlas.")
+    parser.add_argument("--output", default=resource_path("assets"), help="directory for the atlas files")
+    parser.add_argument("--max-side", type=int, default=2048, help="largest page width/height in pixels")
+    args = parser.parse_args(argv)
+    try:
+        count = build_atlas(args.output, max_side=args.max_side)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    print(f"{count} frames packed into {os.path.join(args.output, ATLAS_NAME + '.atlas')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Texture cache for Boulderflash.
+Each image is read once per process and scaled once per size, keyed by
+(asset, size), and the surfaces are shared by every Grid: loading a level
+or restarting after a death costs no I/O. invalidate() drops everything,
+e.g. on a low-memory warning; the next lookups load again. A Preloader
+decodes the files on worker threads ahead of time. With an atlas
+(use_atlas) the frames are regions of a few shared pages instead.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils import resource_path
+
+DEFAULT_ATLAS = "tiles.atlas"
+
+_cache = {} # (asset, size) or (asset, size, frames) -> surface(s), None if missing
+files_loaded = 0 # Images read from disk since start, to check the cache works
+_atlas_path = None # .atlas whose regions fill the cache (use_atlas)
+_atlas_loaded = False
+
+
+def get(asset, size=None):
+    """assets/<asset> scaled to size (w, h), or None if it is missing or unreadable."""
+    key = (asset, size)
+    if key in _cache:
+        return _cache[key]
+    if _atlas_path is not None and not _atlas_loaded:
+        _load_atlas()
+        if key in _cache:
+            return _cache[key]
+    if size is None:
+        surface = _load(asset)
+    else:
+        native = get(asset)
+        surface = None
+        if native is not None:
+            import pygame
+            surface = pygame.transform.scale(native, size)
+    _cache[key] = surface
+    return surface
+
+
+def _load(asset):
+    return _upload(asset, _decode(asset))
+
+
+def _decode(asset):
+    """Read and decode the file; safe on a worker thread."""
+    global files_loaded
+    path = resource_path(os.path.join("assets", asset))
+    if not os.path.exists(path):
+        return None
+    import pygame # Seulement pour l'affichage : la grille tourne aussi sans UI
+    try:
+        image = pygame.image.load(path)
+    except Exception as e:
+        print(f"Error loading {asset}: {e}")
+        return None
+    files_loaded += 1
+    return image
+
+
+def _upload(asset, image):
+    """Turn a decoded image into a display surface / GL texture: main thread only."""
+    if image is None:
+        return None
+    try:
+        return image.convert_alpha()
+    except Exception as e:
+        print(f"Error loading {asset}: {e}")
+        return None
+
+
+def frames(pattern, count, size=None):
+    """The frames pattern.format(0..count-1) that exist, in order."""
+    found = (get(pattern.format(i), size) for i in range(count))
+    return [frame for frame in found if frame is not None]
+
+
+def sheet(asset, count, size=None):
+    """A horizontal sprite sheet cut into count frames, each scaled to size."""
+    key = (asset, size, count)
+    if key in _cache:
+        return _cache[key]
+    if _atlas_path is not None and not _atlas_loaded:
+        _load_atlas()
+        if key in _cache:
+            return _cache[key]
+    image = get(asset)
+    cut = []
+    if image is not None:
+        import pygame
+        frame_w = image.get_width() // count
+        frame_h = image.get_height()
+        for i in range(count):
+            frame = image.subsurface(pygame.Rect(i * frame_w, 0, frame_w, frame_h))
+            cut.append(pygame.transform.scale(frame, size) if size is not None else frame)
+    _cache[key] = cut
+    return cut
+
+
+def use_atlas(path=None):
+    """Serve the frames listed in a .atlas file (texture_atlas.py, by default
+    assets/tiles.atlas) as regions of its pages, from the next lookup on.
+    Returns False, leaving the files in use, if it is missing."""
+    global _atlas_path, _atlas_loaded
+    path = path or resource_path(os.path.join("assets", DEFAULT_ATLAS))
+    if not os.path.exists(path):
+        return False
+    _atlas_path = path
+    _atlas_loaded = False
+    return True
+
+
+def atlas_pages():
+    """Page images of the atlas in use, relative to assets/ (to preload them)."""
+    if _atlas_path is None:
+        return []
+    with open(_atlas_path) as f:
+        return sorted(json.load(f))
+
+
+def _load_atlas():
+    global _atlas_loaded
+    _atlas_loaded = True
+    import pygame
+    with open(_atlas_path) as f:
+        index = json.load(f)
+    sheets = {}
+    for page_name, frames in index.items():
+        page = get(page_name)
+        if page is None:
+            continue
+        page_h = page.get_height()
+        for frame_id, (x, y, w, h) in frames.items():
+            # .atlas : y depuis le bas ; subsurface : depuis le haut
+            region = page.subsurface(pygame.Rect(x, page_h - y - h, w, h))
+            asset, _, frame = frame_id.partition("#")
+            if frame:
+                sheets.setdefault((asset, (w, h)), {})[int(frame)] = region
+            else:
+                _cache[(asset, (w, h))] = region
+    for (asset, size), regions in sheets.items():
+        _cache[(asset, size, len(regions))] = [regions[i] for i in sorted(regions)]
+
+
+def invalidate(asset=None):
+    """Forget one asset (every size), or everything when asset is None.
+    The atlas, if any, is read again on the next lookup."""
+    global _atlas_loaded
+    if asset is None:
+        _cache.clear()
+        _atlas_loaded = False
+        return
+    for key in [key for key in _cache if key[0] == asset]:
+        del _cache[key]
+
+
+def on_low_memory(*args):
+    """Low-memory hook for the frontends: grids keep what they hold, the
+    cache lets go of the rest."""
+    invalidate()
+
+
+class Preloader:
+    """Decodes assets on a thread pool, e.g. while the legend is on screen.
+
+    pump() must be called from the main thread: it uploads the decoded
+    images into the cache, within a time budget so frames keep coming.
+    """
+
+    def __init__(self, assets, workers=4):
+        self.total = len(assets)
+        pending = [asset for asset in assets if (asset, None) not in _cache]
+        self.done = self.total - len(pending)
+        self.pool = ThreadPoolExecutor(max_workers=workers) if pending else None
+        self.futures = [(asset, self.pool.submit(_decode, asset)) for asset in pending]
+
+    @property
+    def progress(self):
+        """Fraction of the assets in the cache, 0.0 to 1.0."""
+        return self.done / self.total if self.total else 1.0
+
+    @property
+    def finished(self):
+        return self.done == self.total
+
+    def pump(self, budget_ms=8.0, wait=False):
+        """Upload the decoded images, for at most budget_ms unless wait is set."""
+        deadline = time.perf_counter() + budget_ms / 1000
+        remaining = []
+        for asset, future in self.futures:
+            if not wait and (not future.done() or time.perf_counter() > deadline):
+                remaining.append((asset, future))
+                continue
+            if (asset, None) not in _cache:
+                _cache[(asset, None)] = _upload(asset, future.result())
+            self.done += 1
+        self.futures = remaining
+        if not remaining and self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def finish(self):
+        """Wait for every decode and upload them all."""
+        self.pump(wait=True)
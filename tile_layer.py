@@ -0,0 +1,106 @@
+"""
+Retained tile layer for the Kivy frontend.
+One Color and one Rectangle per cell, built once per grid. On later frames
+only the cells in the grid's change journal, and the tiles whose animation
+frame moved on, get a new texture: the canvas is not rebuilt 60 times a
+second.
+"""
+from kivy.graphics import InstructionGroup, Color, Rectangle
+
+from animation import AnimationClock, SPEED_CLASSES, frame_speed
+from constants import (
+    TILE_SIZE, COLOR_DATA, COLOR_WALL, COLOR_FIREWALL, COLOR_KEY, COLOR_EXIT,
+    COLOR_PREDATOR, COLOR_BUILDER, COLOR_GRAVITY, COLOR_BOMB, COLOR_TELEPORTER,
+    COLOR_PILLAR, COLOR_SLUDGE, COLOR_EMPTY,
+    DATA, WALL, FIREWALL, KEY, EXIT, PREDATOR, BUILDER, GRAVITY_ZONE,
+    BOMB, TELEPORTER, PILLAR, SLUDGE
+)
+
+# Couleurs quand une tuile n'a pas de texture
+FALLBACK_COLORS = {
+    WALL: COLOR_WALL, DATA: COLOR_DATA, FIREWALL: COLOR_FIREWALL, KEY: COLOR_KEY,
+    EXIT: COLOR_EXIT, PREDATOR: COLOR_PREDATOR, BUILDER: COLOR_BUILDER,
+    GRAVITY_ZONE: COLOR_GRAVITY, BOMB: COLOR_BOMB, TELEPORTER: COLOR_TELEPORTER,
+    PILLAR: COLOR_PILLAR, SLUDGE: COLOR_SLUDGE,
+}
+WHITE = (1, 1, 1, 1)
+
+
+class TileLayer:
+    """The grid's cells as retained canvas instructions (self.group)."""
+
+    def __init__(self):
+        self.group = InstructionGroup()
+        self.grid = None
+        self.clock = AnimationClock()
+
+    def refresh(self):
+        """Rebuild on the next update, e.g. once the grid has its textures."""
+        self.grid = None
+
+    def build(self, grid, current_time, exit_open):
+        self.group.clear()
+        self.grid = grid
+        self.changes = grid.watch()
+        self.changes.drain() # On part de la carte entière
+        self.exit_open = exit_open
+        self.clock.tick(current_time)
+        # Speed class -> animated tile types to re-texture when it advances
+        self.animated_tiles = {speed: set() for speed in SPEED_CLASSES}
+        for key, frames in grid.animated_textures.items():
+            if len(frames) > 1:
+                self.animated_tiles[frame_speed(key)].add(EXIT if isinstance(key, str) else key)
+        self.colors = [None] * len(grid.cells)
+        self.rects = [None] * len(grid.cells)
+        for y in range(grid.height):
+            py = (grid.height - y - 1) * TILE_SIZE # Kivy : y vers le haut
+            for x in range(grid.width):
+                i = grid.index(x, y)
+                texture, color = self.look(grid.cells[i])
+                self.colors[i] = Color(*color)
+                self.rects[i] = Rectangle(texture=texture, pos=(x * TILE_SIZE, py), size=(TILE_SIZE, TILE_SIZE))
+                self.group.add(self.colors[i])
+                self.group.add(self.rects[i])
+
+    def look(self, tile):
+        """(texture or None, rgba) for a tile at the current frame."""
+        animated = self.grid.animated_textures
+        key = ("exit_green" if self.exit_open else "exit_red") if tile == EXIT else tile
+        frames = animated.get(key)
+        if frames:
+            return frames[self.clock.frame(key, len(frames))].texture, WHITE
+        surface = self.grid.textures.get(tile)
+        if surface is not None and surface.texture is not None:
+            return surface.texture, WHITE
+        return None, FALLBACK_COLORS.get(tile, COLOR_EMPTY)
+
+    def paint(self, i, tile):
+        texture, color = self.look(tile)
+        self.rects[i].texture = texture
+        self.colors[i].rgba = color
+
+    def update(self, grid, current_time, exit_open):
+        """Bring the instructions up to date with grid, at current_time (ms)."""
+        if grid is not self.grid:
+            self.build(grid, current_time, exit_open)
+            return
+        full, changes = self.changes.drain()
+        if full:
+            self.build(grid, current_time, exit_open)
+            return
+        cells = grid.cells
+        # Animations : seules les classes de vitesse dont l'image a changé
+        repaint = {tile for speed in self.clock.tick(current_time) for tile in self.animated_tiles[speed]}
+        if exit_open != self.exit_open:
+            self.exit_open = exit_open
+            repaint.add(EXIT)
+
+        # Cases modifiées, d'après le journal de la grille
+        for x, y, _, _ in changes:
+            i = grid.index(x, y)
+            if cells[i] not in repaint:
+                self.paint(i, cells[i])
+        for tile in repaint:
+            for x, y in grid.positions(tile):
+                i = grid.index(x, y)
+                self.paint(i, cells[i])
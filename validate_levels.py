@@ -0,0 +1,178 @@
+"""
+Level validator for Boulderflash.
+Checks every level of levels.LEVELS (or of a level file) on all CPU cores:
+ragged rows, unknown characters, missing or doubled P, missing X, keys and
+exit walled in. Prints per-level statistics and a rough worst-case tick
+cost.
+
+    python validate_levels.py
+    python validate_levels.py --file my_pack.txt --json
+"""
+import argparse
+import json
+import os
+import runpy
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import TILE_CHARS
+
+# Rough cost of one tick, in µs on desktop CPython, when everything wakes up
+# at once: a full physics sweep, a falling object, a cell of the viruses'
+# distance field, a virus or replicator move, a cell of sludge frontier.
+COST_PER_CELL = 0.45
+COST_PER_FALLING = 3.0
+COST_PER_PATH_CELL = 0.5
+COST_PER_PREDATOR = 5.0
+COST_PER_BUILDER = 3.0
+COST_PER_SLUDGE_CELL = 2.0
+
+
+def load_levels(path=None):
+    """levels.LEVELS, a .py file defining LEVELS, or a text file with levels
+    separated by blank lines."""
+    if path is None:
+        from levels import LEVELS
+        return LEVELS
+    if path.endswith(".py"):
+        return runpy.run_path(path)["LEVELS"]
+    with open(path) as f:
+        text = f.read()
+    return [block for block in text.replace("\r\n", "\n").split("\n\n") if block.strip()]
+
+
+def reachable(lines, start):
+    """Squares the player could reach from start if bombs cleared everything
+    but the indestructible walls; teleporters included."""
+    height = len(lines)
+    teleporters = sorted((y, x) for y, line in enumerate(lines) for x, char in enumerate(line) if char == 'T')
+    seen = {start}
+    stack = [start]
+    while stack:
+        x, y = stack.pop()
+        neighbours = [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+        if lines[y][x] == 'T':
+            # Un portail envoie vers le premier autre portail (ordre de lecture)
+            ty, tx = next(t for t in teleporters if t != (y, x)) if len(teleporters) > 1 else (y, x)
+            neighbours.append((tx, ty))
+        for nx, ny in neighbours:
+            if (nx, ny) in seen or not (0 <= ny < height and 0 <= nx < len(lines[ny])):
+                continue
+            if lines[ny][nx] == '#':
+                continue
+            seen.add((nx, ny))
+            stack.append((nx, ny))
+    return seen
+
+
+def validate_level(job):
+    """Check one level; job is (index, map string). Returns a report dict."""
+    index, map_str = job
+    lines = map_str.strip("\n").split("\n")
+    errors = []
+    warnings = []
+
+    widths = {len(line) for line in lines}
+    if len(widths) > 1:
+        short = [y for y, line in enumerate(lines) if len(line) != len(lines[0])]
+        errors.append(f"ragged rows: {len(lines[0])} wide on row 0 but not on rows {short[:5]}")
+    unknown = sorted({char for line in lines for char in line} - set(TILE_CHARS))
+    if unknown:
+        errors.append(f"unknown characters {unknown}")
+
+    counts = Counter(char for line in lines for char in line)
+    players = [(x, y) for y, line in enumerate(lines) for x, char in enumerate(line) if char == 'P']
+    if not players:
+        errors.append("no player start (P)")
+    elif len(players) > 1:
+        errors.append(f"{len(players)} player starts (P)")
+    if not counts['X']:
+        errors.append("no exit (X)")
+
+    width = max(widths) if widths else 0
+    height = len(lines)
+    border = lines[0] + lines[-1] + "".join(line[:1] + line[-1:] for line in lines)
+    if set(border) - {'#'}:
+        warnings.append("map border is not all walls")
+
+    if players:
+        seen = reachable(lines, players[0])
+        walled_keys = [(x, y) for y, line in enumerate(lines) for x, char in enumerate(line)
+                       if char == 'K' and (x, y) not in seen]
+        if walled_keys:
+            errors.append(f"keys walled in at {walled_keys[:5]}")
+        if counts['X'] and not any(lines[y][x] == 'X' for x, y in seen):
+            errors.append("exit walled in")
+
+    falling = counts['F'] + counts['K']
+    path_cells = counts['.'] + counts['P']
+    cost_us = COST_PER_CELL * width * height + COST_PER_FALLING * falling
+    if counts['A']:
+        cost_us += COST_PER_PATH_CELL * path_cells + COST_PER_PREDATOR * counts['A']
+    cost_us += COST_PER_BUILDER * counts['B']
+    if counts['S']:
+        # Au pire la corruption finit par border toutes les cases vides
+        cost_us += COST_PER_SLUDGE_CELL * (counts['S'] + path_cells)
+
+    return {
+        "level": index,
+        "size": [width, height],
+        "errors": errors,
+        "warnings": warnings,
+        "tiles": {char: counts[char] for char in TILE_CHARS if counts[char]},
+        "keys": counts['K'],
+        "falling_objects": falling,
+        "predators": counts['A'],
+        "builders": counts['B'],
+        "sludge": counts['S'],
+        "gravity_wells": counts['G'],
+        "teleporters": counts['T'],
+        "worst_tick_us": round(cost_us, 1),
+    }
+
+
+def validate_all(levels, jobs=None):
+    jobs = jobs or os.cpu_count() or 1
+    work = list(enumerate(levels))
+    if jobs == 1 or len(work) < 2:
+        return [validate_level(job) for job in work]
+    chunksize = max(1, len(work) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(validate_level, work, chunksize=chunksize))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and analyze levels.")
+    parser.add_argument("--file", help="level file: .py defining LEVELS, or levels separated by blank lines")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    parser.add_argument("--slowdown", type=float, default=10.0,
+                        help="how much slower the target phone is than this machine")
+    parser.add_argument("--budget", type=float, default=150.0, help="tick budget in ms")
+    args = parser.parse_args(argv)
+
+    reports = validate_all(load_levels(args.file), args.jobs)
+    for report in reports:
+        report["over_budget"] = report["worst_tick_us"] * args.slowdown / 1000 > args.budget
+    invalid = [report for report in reports if report["errors"]]
+
+    if args.json:
+        print(json.dumps({"levels": reports, "invalid": [r["level"] for r in invalid]}, indent=2))
+    else:
+        for report in reports:
+            for problem in report["errors"]:
+                print(f"level {report['level'] + 1}: ERROR {problem}")
+            for problem in report["warnings"]:
+                print(f"level {report['level'] + 1}: warning {problem}")
+        worst = max(reports, key=lambda r: r["worst_tick_us"], default=None)
+        print(f"{len(reports)} levels, {len(invalid)} invalid, "
+              f"{sum(r['over_budget'] for r in reports)} over the {args.budget:.0f} ms budget")
+        if worst:
+            print(f"heaviest: level {worst['level'] + 1} ({worst['size'][0]}x{worst['size'][1]}), "
+                  f"~{worst['worst_tick_us']:.0f} µs per tick here")
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())